@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 import threading
-from typing import Set
+from typing import Dict, Optional, Set
 import logging
 from aiogram.types import InlineQuery
 
@@ -15,7 +15,7 @@ load_dotenv()
 """
 
 class AccessControl:
-    _lock = threading.Lock()
+    _lock = threading.RLock()
     _admin_ids: Set[int] = set()
     _user_ids: Set[int] = set()
     _super_admin_id: int = int(os.getenv("SUPER_ADMIN", 0))
@@ -30,6 +30,28 @@ class AccessControl:
             cls._admin_ids = {int(id_str.strip()) for id_str in admin_ids.split(",") if id_str.strip()}
             cls._user_ids = {int(id_str.strip()) for id_str in user_ids.split(",") if id_str.strip()}
 
+    @classmethod
+    def apply_env(cls, env: Dict[str, Optional[str]]) -> Dict[str, int]:
+        """Применяет значения из перечитанного .env, меняя только отличающиеся ID"""
+        admin_ids = {int(id_str.strip()) for id_str in (env.get("ADMIN_IDS") or "").split(",") if id_str.strip()}
+        user_ids = {int(id_str.strip()) for id_str in (env.get("USER_IDS") or "").split(",") if id_str.strip()}
+        super_admin_id = int(env.get("SUPER_ADMIN") or 0)
+
+        with cls._lock:
+            changes = {
+                "admins_added": len(admin_ids - cls._admin_ids),
+                "admins_removed": len(cls._admin_ids - admin_ids),
+                "users_added": len(user_ids - cls._user_ids),
+                "users_removed": len(cls._user_ids - user_ids),
+                "super_admin_changed": int(super_admin_id != cls._super_admin_id),
+            }
+            cls._admin_ids.difference_update(cls._admin_ids - admin_ids)
+            cls._admin_ids.update(admin_ids)
+            cls._user_ids.difference_update(cls._user_ids - user_ids)
+            cls._user_ids.update(user_ids)
+            cls._super_admin_id = super_admin_id
+        return changes
+
     @classmethod
     def is_super_admin(cls, user_id: int) -> bool:
         """Проверяет, является ли пользователь супер-админом"""
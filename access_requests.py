@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from keyboards import get_access_digest_keyboard
+from voice_storage import atomic_open
+
+"""
+Заявки на доступ от неавторизованных пользователей.
+Одна заявка на пользователя, паузы между заявками и после отказа,
+а админу уходит один дайджест за окно DIGEST_INTERVAL, сколько бы заявок ни пришло.
+"""
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_FILE = "access_requests.json"
+REQUEST_COOLDOWN = 10 * 60       # Пауза между заявками одного пользователя
+REJECT_COOLDOWN = 24 * 3600      # Пауза после отказа
+MAX_REASON_LENGTH = 200
+DIGEST_INTERVAL = 30             # Окно склейки уведомлений, сек
+DIGEST_MAX_ITEMS = 10            # Заявок с кнопками в одном дайджесте
+
+class AccessRequestQueue:
+    def __init__(self, path: str = REQUESTS_FILE):
+        self.path = path
+        self.pending: Dict[int, dict] = {}        # user_id -> {"name", "reason", "created_at"}
+        self.last_request: Dict[int, float] = {}  # user_id -> время последней заявки
+        self.rejected_until: Dict[int, float] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.pending = {int(k): v for k, v in data.get("pending", {}).items()}
+        self.last_request = {int(k): v for k, v in data.get("last_request", {}).items()}
+        self.rejected_until = {int(k): v for k, v in data.get("rejected_until", {}).items()}
+
+    def _save(self) -> None:
+        now = time.time()
+        # Истёкшие паузы хранить незачем
+        self.last_request = {k: v for k, v in self.last_request.items() if v + REQUEST_COOLDOWN > now}
+        self.rejected_until = {k: v for k, v in self.rejected_until.items() if v > now}
+
+        with atomic_open(self.path) as f:
+            json.dump({
+                "pending": self.pending,
+                "last_request": self.last_request,
+                "rejected_until": self.rejected_until,
+            }, f, ensure_ascii=False, indent=4)
+
+    def check(self, user_id: int) -> Optional[str]:
+        """Возвращает причину отказа в новой заявке или None, если можно подавать"""
+        now = time.time()
+        if user_id in self.pending:
+            return "⏳ Ваша заявка уже на рассмотрении"
+        if self.rejected_until.get(user_id, 0) > now:
+            return "🚫 Заявка была отклонена, попробуйте позже"
+        if self.last_request.get(user_id, 0) + REQUEST_COOLDOWN > now:
+            return "⏳ Слишком частые заявки, попробуйте позже"
+        return None
+
+    def add(self, user_id: int, name: str, reason: str) -> bool:
+        if self.check(user_id):
+            return False
+        now = time.time()
+        self.pending[user_id] = {"name": name, "reason": reason[:MAX_REASON_LENGTH], "created_at": now}
+        self.last_request[user_id] = now
+        self._save()
+        return True
+
+    def approve(self, user_id: int) -> Optional[dict]:
+        request = self.pending.pop(user_id, None)
+        if request:
+            self._save()
+        return request
+
+    def reject(self, user_id: int) -> Optional[dict]:
+        request = self.pending.pop(user_id, None)
+        if request:
+            self.rejected_until[user_id] = time.time() + REJECT_COOLDOWN
+            self._save()
+        return request
+
+    def oldest(self, limit: int = DIGEST_MAX_ITEMS) -> List[Tuple[int, dict]]:
+        return sorted(self.pending.items(), key=lambda item: item[1]["created_at"])[:limit]
+
+def format_digest(requests: AccessRequestQueue) -> str:
+    shown = requests.oldest()
+    lines = [f"📨 Заявки на доступ ({len(requests.pending)}):", ""]
+    for user_id, request in shown:
+        lines.append(f"• {request['name']} (ID: {user_id})")
+        if request["reason"]:
+            lines.append(f"  «{request['reason']}»")
+    if len(requests.pending) > len(shown):
+        lines.append(f"\n…и ещё {len(requests.pending) - len(shown)}, обработайте эти, чтобы увидеть остальные")
+    return "\n".join(lines)
+
+class AccessDigest:
+    """Склеивает уведомления о заявках в одно сообщение за окно"""
+
+    def __init__(self, requests: AccessRequestQueue):
+        self.requests = requests
+        self._new_requests = asyncio.Event()
+
+    def notify(self) -> None:
+        self._new_requests.set()
+
+    async def run(self, bot: Bot, get_admin_id: Callable[[], int], interval: float = DIGEST_INTERVAL) -> None:
+        """Фоновая задача: не чаще раза в interval шлёт админу сводку ожидающих заявок"""
+        if self.requests.pending:
+            self.notify()  # Заявки, пережившие перезапуск
+        while True:
+            await self._new_requests.wait()
+            await asyncio.sleep(interval)  # Копим всплеск заявок в одно сообщение
+            self._new_requests.clear()
+            if not self.requests.pending:
+                continue
+            try:
+                await bot.send_message(
+                    get_admin_id(),
+                    format_digest(self.requests),
+                    parse_mode=None,
+                    reply_markup=get_access_digest_keyboard(self.requests.oldest())
+                )
+            except Exception as e:
+                logger.error(f"Не удалось отправить дайджест заявок: {e}")
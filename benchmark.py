@@ -0,0 +1,741 @@
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+"""
+Бенчмарк бота без спама в настоящий Telegram.
+Поднимает fake_bot_api.FakeBotAPI, грузит настоящий dp из bot.py
+и прогоняет синтетические нагрузки через dp.feed_update.
+
+Примеры:
+    python benchmark.py                       # все сценарии
+    python benchmark.py inline_storm --users 200
+    python benchmark.py --json > bench.json   # сохранить результат
+    python benchmark.py --baseline bench.json # упасть при регрессии p99
+"""
+
+BENCH_TOKEN = "123456:BENCHMARK"
+SUPER_ADMIN_ID = 1
+ADMIN_BASE_ID = 100
+USER_BASE_ID = 10_000
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS: Dict[str, Callable[["BenchContext"], Awaitable["ScenarioResult"]]] = {}
+
+def scenario(name: str):
+    """Регистрирует сценарий бенчмарка"""
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+# ======================
+# Результаты
+# ======================
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class ScenarioResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.wall_time = 0.0
+        self.api_calls: Dict[str, int] = {}
+        self.extra: Dict[str, float] = {}
+        self.skipped: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        count = len(self.latencies)
+        return {
+            "name": self.name,
+            "skipped": self.skipped,
+            "updates": count,
+            "errors": self.errors,
+            "wall_time_s": round(self.wall_time, 4),
+            "updates_per_sec": round(count / self.wall_time, 2) if self.wall_time else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 3),
+            "max_ms": round(max(self.latencies, default=0.0) * 1000, 3),
+            "api_calls": self.api_calls,
+            **self.extra,
+        }
+
+def print_report(results: List[ScenarioResult]) -> None:
+    header = f"{'scenario':<20}{'updates':>9}{'err':>6}{'upd/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        row = result.as_dict()
+        if result.skipped:
+            print(f"{row['name']:<20}  skipped: {result.skipped}")
+            continue
+        print(
+            f"{row['name']:<20}{row['updates']:>9}{row['errors']:>6}{row['updates_per_sec']:>11}"
+            f"{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+        for key, value in result.extra.items():
+            print(f"{'':<20}  {key}: {value}")
+
+def compare_with_baseline(results: List[ScenarioResult], baseline_path: str, tolerance: float) -> List[str]:
+    """Возвращает список регрессий p99/пропускной способности относительно baseline"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {row["name"]: row for row in json.load(f)}
+
+    regressions = []
+    for result in results:
+        current = result.as_dict()
+        old = baseline.get(result.name)
+        if result.skipped or not old or old.get("skipped"):
+            continue
+        if old["p99_ms"] and current["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{result.name}: p99 {old['p99_ms']} -> {current['p99_ms']} ms")
+        if old["updates_per_sec"] and current["updates_per_sec"] < old["updates_per_sec"] * (1 - tolerance):
+            regressions.append(f"{result.name}: upd/s {old['updates_per_sec']} -> {current['updates_per_sec']}")
+    return regressions
+
+# ======================
+# Окружение
+# ======================
+
+class BenchContext:
+    def __init__(self, args: argparse.Namespace, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.media_dir = os.path.join(workdir, "media")
+        self.api = None
+        self.bot = None
+        self.bot_module = None
+        self.dp = None
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    async def setup(self) -> None:
+        from aiogram import Bot
+        from aiogram.client.default import DefaultBotProperties
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        from aiogram.enums import ParseMode
+        from fake_bot_api import FakeBotAPI
+
+        os.makedirs(self.media_dir, exist_ok=True)
+        self.prepare_media()
+        self.api = FakeBotAPI(self.media_dir, latency=self.args.api_latency / 1000)
+        base_url = await self.api.start()
+
+        self.bot_module = load_bot_module(self.args, self.workdir)
+        self.dp = self.bot_module.dp
+        self.bot = Bot(
+            token=BENCH_TOKEN,
+            session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        # Вспомогательные функции bot.py ходят через глобальный bot
+        await self.bot_module.bot.session.close()
+        self.bot_module.bot = self.bot
+
+    @contextmanager
+    def without_inline_throttle(self):
+        """Инлайн-апдейты мимо InlineThrottleMiddleware: иначе задержку задаёт DEBOUNCE,
+        а большая часть запросов склеивается или отбрасывается, и мерится сон, а не поиск"""
+        manager = self.dp.inline_query.outer_middleware
+        throttle = self.bot_module.inline_throttle
+        manager.unregister(throttle)
+        try:
+            yield
+        finally:
+            manager.register(throttle)
+
+    async def teardown(self) -> None:
+        # Фоновые проверки дубликатов после voice_saves ещё ходят в API - гасим до закрытия сессии
+        if self.bot_module:
+            await self.bot_module.duplicate_detector.cancel_checks()
+        if self.bot:
+            await self.bot.session.close()
+        if self.api:
+            await self.api.stop()
+
+    def prepare_media(self) -> None:
+        """Готовит тестовые медиафайлы (нужен ffmpeg для видео)"""
+        voice_path = os.path.join(self.media_dir, "voice.ogg")
+        if not os.path.exists(voice_path):
+            with open(voice_path, "wb") as f:
+                f.write(b"OggS" + os.urandom(2048))
+
+        if shutil.which("ffmpeg") is None:
+            return
+        video_path = os.path.join(self.media_dir, "video.mp4")
+        if not os.path.exists(video_path):
+            subprocess.run([
+                "ffmpeg", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=25:duration={self.args.video_seconds}",
+                "-f", "lavfi", "-i", f"sine=frequency=440:duration={self.args.video_seconds}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", "-y", video_path
+            ], check=True, capture_output=True)
+
+    # ======================
+    # Конструкторы апдейтов
+    # ======================
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def _message(self, user_id: int, **extra) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+        }
+        message.update(extra)
+        return message
+
+    def make_update(self, **payload):
+        from aiogram.types import Update
+        return Update.model_validate(
+            {"update_id": next(self._update_ids), **payload},
+            context={"bot": self.bot},
+        )
+
+    def text_update(self, user_id: int, text: str):
+        return self.make_update(message=self._message(user_id, text=text))
+
+    def inline_update(self, user_id: int, query: str):
+        return self.make_update(inline_query={
+            "id": str(next(self._update_ids)),
+            "from": self._user(user_id),
+            "query": query,
+            "offset": "",
+        })
+
+    def chosen_update(self, user_id: int, result_id: str, query: str = ""):
+        return self.make_update(chosen_inline_result={
+            "result_id": result_id,
+            "from": self._user(user_id),
+            "query": query,
+        })
+
+    def voice_update(self, user_id: int, file_id: str, duration: int = 3):
+        return self.make_update(message=self._message(user_id, voice={
+            "file_id": file_id,
+            "file_unique_id": file_id[-16:],
+            "duration": duration,
+            "mime_type": "audio/ogg",
+            "file_size": 2048,
+        }))
+
+    def video_update(self, user_id: int, file_id: str):
+        self.api.register_file(file_id, "video.mp4")
+        return self.make_update(message=self._message(user_id, video={
+            "file_id": file_id,
+            "file_unique_id": file_id[-16:],
+            "width": 320,
+            "height": 240,
+            "duration": self.args.video_seconds,
+            "file_size": os.path.getsize(os.path.join(self.media_dir, "video.mp4")),
+        }))
+
+    # ======================
+    # Прогон
+    # ======================
+
+    async def run_updates(self, name: str, updates: list, concurrency: Optional[int] = None) -> ScenarioResult:
+        """Скармливает апдейты в dp с ограниченной параллельностью и замеряет задержки"""
+        result = ScenarioResult(name)
+        semaphore = asyncio.Semaphore(concurrency or self.args.concurrency)
+        calls_before = self.api.calls.copy()
+
+        async def feed(update) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await self.dp.feed_update(self.bot, update)
+                except Exception:
+                    result.errors += 1
+                result.latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(feed(update) for update in updates))
+        result.wall_time = time.perf_counter() - started
+        result.api_calls = dict(self.api.calls - calls_before)
+        return result
+
+def seed_workdir(args: argparse.Namespace, workdir: str) -> None:
+    """Создаёт voices.json и .env в рабочей папке бенчмарка"""
+    words = ["Вай", "Ахуенный", "Альберт", "Илья", "До", "Смех", "Музыка", "Привет", "Пока", "Ну"]
+    voices = {
+        f"{words[i % len(words)]} {i}": f"BENCH_VOICE_{i:08d}_" + "x" * 48
+        for i in range(args.voices)
+    }
+    with open(os.path.join(workdir, "voices.json"), "w", encoding="utf-8") as f:
+        json.dump(voices, f, ensure_ascii=False, indent=4)
+    # [duration, file_size, mime_type, uploader_id, created_at] как в VoiceMeta
+    meta = {file_id: [i % 30, 4096, "audio/ogg", SUPER_ADMIN_ID, 0] for i, file_id in enumerate(voices.values())}
+    with open(os.path.join(workdir, "voices_meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    # Теги с перекосом популярности: t0 почти у всех, хвост из редких
+    rng = random.Random(42)
+    tags = {
+        file_id: [f"t{int(args.tags ** rng.random()) - 1}" for _ in range(args.tags_per_voice)]
+        for file_id in voices.values()
+    }
+    with open(os.path.join(workdir, "voice_tags.json"), "w", encoding="utf-8") as f:
+        json.dump(tags, f)
+
+    env = {
+        "BOT_TOKEN": BENCH_TOKEN,
+        "SUPER_ADMIN": str(SUPER_ADMIN_ID),
+        "ADMIN_IDS": ",".join(str(ADMIN_BASE_ID + i) for i in range(args.admins)),
+        "USER_IDS": ",".join(str(USER_BASE_ID + i) for i in range(args.users)),
+        "LOG_CHANNEL_ID": "",
+    }
+    with open(os.path.join(workdir, ".env"), "w") as f:
+        for key, value in env.items():
+            f.write(f"{key}={value}\n")
+    os.environ.update(env)
+
+def load_bot_module(args: argparse.Namespace, workdir: str):
+    """Импортирует bot.py так, чтобы все файлы писались в workdir"""
+    seed_workdir(args, workdir)
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return importlib.import_module("bot")
+
+# ======================
+# Сценарии
+# ======================
+
+@scenario("inline_storm")
+async def inline_storm(ctx: BenchContext) -> ScenarioResult:
+    """Пользователи набирают запрос посимвольно — по апдейту на нажатие"""
+    words = ["вай мама", "альберт", "смех 12", "музыка", "<5 ну", ""]
+    keystrokes = [
+        (USER_BASE_ID + i, words[i % len(words)][:length])
+        for i in range(ctx.args.users) for length in range(len(words[i % len(words)]) + 1)
+    ]
+    # Задержки и регрессии - по самому поиску; склейку и отбрасывание показывает второй прогон с лимитами
+    with ctx.without_inline_throttle():
+        result = await ctx.run_updates("inline_storm", [ctx.inline_update(*keystroke) for keystroke in keystrokes])
+    stats_before = ctx.bot_module.inline_throttle.stats.copy()
+    throttled = await ctx.run_updates("inline_storm", [ctx.inline_update(*keystroke) for keystroke in keystrokes])
+    result.extra.update(ctx.bot_module.inline_throttle.stats - stats_before)
+    result.extra["throttled_p50_ms"] = round(percentile(throttled.latencies, 50) * 1000, 3)
+    return result
+
+@scenario("empty_query_recents")
+async def empty_query_recents(ctx: BenchContext) -> ScenarioResult:
+    """Выбор результатов вперемешку с пустыми запросами (страница недавних/популярных)"""
+    from voice_storage import voice_key
+    file_ids = list(ctx.bot_module.storage.voices.values())
+    updates = []
+    for i in range(ctx.args.users):
+        user_id = USER_BASE_ID + i
+        for j in range(5):
+            updates.append(ctx.chosen_update(user_id, voice_key(file_ids[(i * 7 + j) % len(file_ids)])))
+            updates.append(ctx.inline_update(user_id, ""))
+    with ctx.without_inline_throttle():
+        return await ctx.run_updates("empty_query_recents", updates)
+
+@scenario("tag_search")
+async def tag_search(ctx: BenchContext) -> ScenarioResult:
+    """Поиск по тегам: частые, редкие, пересечения и недописанные теги"""
+    from voice_search import parse_query, search
+    queries = ["#t0", "#t1 #t0", "#t3 #t7", f"#t{ctx.args.tags - 1}", "#t1", "#t0 вай", "#t1 #t2 <10"]
+    updates = [
+        ctx.inline_update(USER_BASE_ID + i % max(ctx.args.users, 1), queries[i % len(queries)])
+        for i in range(ctx.args.users * len(queries))
+    ]
+    with ctx.without_inline_throttle():
+        result = await ctx.run_updates("tag_search", updates)
+
+    # Чистое время поиска без апдейтов и HTTP
+    storage = ctx.bot_module.storage
+    parsed = [parse_query(query) for query in queries]
+    started = time.perf_counter()
+    rounds = 200
+    for _ in range(rounds):
+        for query in parsed:
+            list(search(storage, query, 50))
+    result.extra["direct_search_us"] = round((time.perf_counter() - started) / (rounds * len(parsed)) * 1e6, 2)
+    result.extra["distinct_tags"] = len(storage.tag_counts())
+    return result
+
+@scenario("voice_saves")
+async def voice_saves(ctx: BenchContext) -> ScenarioResult:
+    """Админ присылает новые голосовые подряд"""
+    updates = [
+        ctx.voice_update(SUPER_ADMIN_ID, f"BENCH_NEW_VOICE_{i:08d}_" + "y" * 44)
+        for i in range(ctx.args.saves)
+    ]
+    return await ctx.run_updates("voice_saves", updates)
+
+@scenario("video_conversions")
+async def video_conversions(ctx: BenchContext) -> ScenarioResult:
+    """Параллельная конвертация видео в голосовые через ffmpeg"""
+    if shutil.which("ffmpeg") is None:
+        result = ScenarioResult("video_conversions")
+        result.skipped = "ffmpeg not found"
+        return result
+    updates = [
+        ctx.video_update(ADMIN_BASE_ID + i % max(ctx.args.admins, 1), f"BENCH_VIDEO_{i:08d}")
+        for i in range(ctx.args.videos)
+    ]
+    return await ctx.run_updates("video_conversions", updates)
+
+@scenario("video_ingest")
+async def video_ingest(ctx: BenchContext) -> ScenarioResult:
+    """Большое видео -> голосовое: скачивание по HTTP против чтения с диска локального Bot API"""
+    result = ScenarioResult("video_ingest")
+    if shutil.which("ffmpeg") is None:
+        result.skipped = "ffmpeg not found"
+        return result
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from fake_bot_api import FakeBotAPI
+    from video_processor import extract_voice
+
+    video_path = os.path.join(ctx.media_dir, "large_video.mp4")
+    if not os.path.exists(video_path):
+        seconds = ctx.args.large_video_seconds
+        await asyncio.to_thread(subprocess.run, [
+            "ffmpeg", "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "20M", "-c:a", "aac", "-shortest", "-y", video_path
+        ], check=True, capture_output=True)
+    result.extra["video_mb"] = round(os.path.getsize(video_path) / 2 ** 20, 1)
+
+    local_api = FakeBotAPI(ctx.media_dir, latency=ctx.args.api_latency / 1000, is_local=True)
+    local_url = await local_api.start()
+    bots = {
+        "http": Bot(token=BENCH_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(ctx.api.base_url))),
+        "local": Bot(token=BENCH_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(local_url, is_local=True))),
+    }
+    ctx.api.register_file("BENCH_LARGE_VIDEO", "large_video.mp4")
+    local_api.register_file("BENCH_LARGE_VIDEO", "large_video.mp4")
+    temp_dir = os.path.join(ctx.workdir, "temp")
+    downloads_before = ctx.api.calls["file_download"]
+    started = time.perf_counter()
+    try:
+        for mode, bot in bots.items():
+            timings = []
+            for i in range(ctx.args.videos):
+                before = time.perf_counter()
+                try:
+                    await extract_voice(bot, "BENCH_LARGE_VIDEO", temp_dir, f"bench_{mode}_{i}")
+                except Exception:
+                    result.errors += 1
+                    continue
+                timings.append(time.perf_counter() - before)
+            result.latencies.extend(timings)
+            result.extra[f"{mode}_p50_ms"] = round(percentile(timings, 50) * 1000, 1)
+    finally:
+        for bot in bots.values():
+            await bot.session.close()
+        await local_api.stop()
+    result.wall_time = time.perf_counter() - started
+    result.api_calls = {"file_download": ctx.api.calls["file_download"] - downloads_before}
+    return result
+
+@scenario("admin_lists")
+async def admin_lists(ctx: BenchContext) -> ScenarioResult:
+    """Рендер списков админов, говорунов и голосовых"""
+    texts = ["📋 Список админов", "📋 Список говорунов", "📋 Список голосовых"]
+    updates = [
+        ctx.text_update(SUPER_ADMIN_ID, texts[i % len(texts)])
+        for i in range(ctx.args.renders)
+    ]
+    return await ctx.run_updates("admin_lists", updates)
+
+@scenario("duplicate_lookup")
+async def duplicate_lookup(ctx: BenchContext) -> ScenarioResult:
+    """Поиск похожих по отпечатку в LSH-индексе на --voices записей (без ffmpeg и API)"""
+    result = ScenarioResult("duplicate_lookup")
+    try:
+        import numpy as np
+    except ImportError:
+        result.skipped = "numpy not installed"
+        return result
+    from voice_fingerprint import DIMENSIONS, FingerprintIndex
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((ctx.args.voices, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = FingerprintIndex(os.path.join(ctx.workdir, "bench_fingerprints.json"))
+    for i, vector in enumerate(vectors):
+        index.add(f"BENCH_VOICE_{i}", vector)
+
+    # Запросы - слегка зашумлённые копии, как перезаписанное голосовое
+    queries = vectors[rng.integers(0, len(vectors), 500)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+    found = 0
+    started = time.perf_counter()
+    for query in queries:
+        query = query / np.linalg.norm(query)
+        before = time.perf_counter()
+        found += bool(index.query(query))
+        result.latencies.append(time.perf_counter() - before)
+    result.wall_time = time.perf_counter() - started
+    result.extra["recall"] = round(found / len(queries), 3)
+    return result
+
+MEMORY_PROBE = """
+import gc, json, sys, time, tracemalloc
+sys.path.insert(0, sys.argv[3])
+from voice_storage import VoiceMeta, VoiceStorage, read_voices_file, voice_key
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+
+variant, traced = sys.argv[1], sys.argv[4] == "trace"
+rss_before = rss_kb()
+if traced:
+    tracemalloc.start()
+started = time.perf_counter()
+if variant == "legacy":
+    # Как было до колоночного хранилища: dict + ключи строками + namedtuple на запись + копия списка
+    voices = read_voices_file()
+    keys = {voice_key(file_id): title for title, file_id in voices.items()}
+    with open("voices_meta.json", encoding="utf-8") as f:
+        meta = {file_id: VoiceMeta(*record) for file_id, record in json.load(f).items()}
+    snapshot = list(voices.items())
+    probe = lambda key: (keys[key], voices[keys[key]])
+else:
+    storage = VoiceStorage()
+    snapshot = storage.get_all_voices()
+    probe = storage.get_by_key
+load_time = time.perf_counter() - started
+gc.collect()
+if traced:
+    # tracemalloc сам ест память и время, поэтому RSS и скорость меряются в прогоне без него
+    current, peak = tracemalloc.get_traced_memory()
+    print(json.dumps({"retained_mb": round(current / 2**20, 1), "peak_mb": round(peak / 2**20, 1)}))
+    sys.exit()
+rss_after = rss_kb()
+
+sample = [voice_key(file_id) for _, (_, file_id) in zip(range(10_000), reversed(list(snapshot)))]
+started = time.perf_counter()
+for key in sample:
+    probe(key)
+lookup_us = (time.perf_counter() - started) / len(sample) * 1e6
+print(json.dumps({
+    "rss_mb": round((rss_after - rss_before) / 1024, 1),
+    "load_s": round(load_time, 2), "lookup_us": round(lookup_us, 3),
+}))
+"""
+
+@scenario("memory")
+async def memory(ctx: BenchContext) -> ScenarioResult:
+    """Память библиотеки на --entries записей: старое представление против VoiceStorage.
+    Каждый вариант меряется в отдельном процессе (tracemalloc и прирост VmRSS)"""
+    result = ScenarioResult("memory")
+    datadir = tempfile.mkdtemp(prefix="tg_bot_memory_", dir=ctx.workdir)
+    seed_args = argparse.Namespace(**{**vars(ctx.args), "voices": ctx.args.entries, "tags_per_voice": 0})
+    seed_workdir(seed_args, datadir)
+
+    started = time.perf_counter()
+    for variant, mode in itertools.product(("legacy", "compact"), ("trace", "rss")):
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", MEMORY_PROBE, variant, datadir, REPO_DIR, mode,
+            cwd=datadir, stdout=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
+        if proc.returncode != 0:
+            result.errors += 1
+            continue
+        for key, value in json.loads(stdout).items():
+            result.extra[f"{variant}_{key}"] = value
+    result.wall_time = time.perf_counter() - started
+    return result
+
+STORAGE_CHURN_PROBE = """
+import json, random, sys, time
+sys.path.insert(0, sys.argv[2])
+from voice_storage import VoiceMeta, VoiceStorage
+
+# Случайные изменения против простой модели-словаря: после каждой операции
+# содержимое должно совпадать с моделью, а колонки и индексы - между собой
+rng = random.Random(42)
+storage = VoiceStorage()
+model = dict(storage.voices)
+counter, problems, compactions, latencies = [0], [], 0, []
+
+def new_file_id():
+    counter[0] += 1
+    return f"CHURN_{counter[0]:08d}_" + "y" * 40
+
+def some_titles(count):
+    return rng.sample(list(model), min(count, len(model)))
+
+def op_save():
+    title = rng.choice(list(model)) if model and rng.random() < 0.2 else f"Новое {counter[0]}"
+    file_id = new_file_id()
+    if storage.save_voice(title, file_id, VoiceMeta(rng.randint(1, 60), 4096, "audio/ogg", 1, 0)):
+        model[title] = file_id
+
+def op_delete():
+    for title in some_titles(1):
+        storage.delete_voice(title)
+        del model[title]
+
+def op_rename():
+    for title in some_titles(1):
+        new = f"Имя {new_file_id()[6:14]}"
+        storage.rename_voice(title, new)
+        model[new] = model.pop(title)
+
+def op_replace():
+    for title in some_titles(1):
+        file_id = new_file_id()
+        storage.replace_file(title, file_id, VoiceMeta(rng.randint(1, 60), 4096, "audio/ogg", 1, 0))
+        model[title] = file_id
+
+def op_tags():
+    for title in some_titles(1):
+        storage.set_tags(title, rng.sample(["a", "b", "c", "d"], rng.randint(0, 3)))
+
+def op_batch():
+    titles = some_titles(4)
+    deletes, renames = titles[:2], {title: f"Пачка {new_file_id()[6:14]}" for title in titles[2:]}
+    if storage.apply_batch(deletes, renames):
+        for title in deletes:
+            del model[title]
+        for old, new in renames.items():
+            model[new] = model.pop(old)
+
+def op_snapshot():
+    snapshot = dict(model)
+    for title in some_titles(len(model) // 4):
+        del snapshot[title]
+    for title in rng.sample(list(snapshot), min(len(snapshot), 5)):
+        snapshot[title] = new_file_id()
+    for _ in range(rng.randint(0, 20)):
+        snapshot[f"Снимок {new_file_id()[6:14]}"] = new_file_id()
+    storage.apply_snapshot(snapshot)
+    model.clear()
+    model.update(snapshot)
+
+operations = [op_save] * 6 + [op_delete] * 5 + [op_rename, op_replace, op_tags, op_batch] * 2 + [op_snapshot]
+for _ in range(int(sys.argv[1])):
+    operation = rng.choice(operations)
+    rows_before = len(storage._titles)
+    started = time.perf_counter()
+    operation()
+    latencies.append(time.perf_counter() - started)
+    compactions += len(storage._titles) < rows_before
+    found = storage.check_invariants()
+    if dict(storage.voices) != model:
+        found.append("содержимое не совпадает с моделью")
+    if found:
+        problems.append(f"{operation.__name__}: {', '.join(found)}")
+    if len(problems) >= 10:
+        break
+print(json.dumps({"latencies": latencies, "problems": problems, "compactions": compactions, "live": len(model)}))
+"""
+
+@scenario("storage_churn")
+async def storage_churn(ctx: BenchContext) -> ScenarioResult:
+    """Случайные сохранения, удаления, переименования, пачки и снимки voices.json
+    на отдельной копии библиотеки; после каждой операции проверяются инварианты хранилища.
+    Нарушения считаются ошибками и печатаются"""
+    result = ScenarioResult("storage_churn")
+    datadir = tempfile.mkdtemp(prefix="tg_bot_churn_", dir=ctx.workdir)
+    seed_workdir(argparse.Namespace(**{**vars(ctx.args), "voices": max(ctx.args.voices, 1500)}), datadir)
+
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", STORAGE_CHURN_PROBE, str(ctx.args.churn_ops), REPO_DIR,
+        cwd=datadir, stdout=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await proc.communicate()
+    result.wall_time = time.perf_counter() - started
+    if proc.returncode != 0:
+        result.errors += 1
+        return result
+    report = json.loads(stdout)
+    result.latencies = report["latencies"]
+    result.errors = len(report["problems"])
+    for problem in report["problems"]:
+        print(f"storage_churn: {problem}", file=sys.stderr)
+    result.extra["compactions"] = report["compactions"]
+    result.extra["live_voices"] = report["live"]
+    return result
+
+# ======================
+# Запуск
+# ======================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк бота на фейковом Bot API")
+    parser.add_argument("scenarios", nargs="*", help=f"Сценарии: {', '.join(SCENARIOS)}")
+    parser.add_argument("--voices", type=int, default=1000, help="Голосовых в библиотеке")
+    parser.add_argument("--tags", type=int, default=5000, help="Различных тегов в библиотеке")
+    parser.add_argument("--tags-per-voice", type=int, default=3, help="Тегов на голосовое")
+    parser.add_argument("--users", type=int, default=100, help="Пользователей в inline_storm")
+    parser.add_argument("--admins", type=int, default=20, help="Админов в .env")
+    parser.add_argument("--saves", type=int, default=200, help="Сохранений в voice_saves")
+    parser.add_argument("--videos", type=int, default=8, help="Видео в video_conversions")
+    parser.add_argument("--video-seconds", type=int, default=5, help="Длина тестового видео")
+    parser.add_argument("--entries", type=int, default=1_000_000, help="Записей в сценарии memory")
+    parser.add_argument("--large-video-seconds", type=int, default=20, help="Длина видео ~20 Мбит/с в video_ingest")
+    parser.add_argument("--churn-ops", type=int, default=3000, help="Операций в storage_churn")
+    parser.add_argument("--renders", type=int, default=60, help="Рендеров в admin_lists")
+    parser.add_argument("--concurrency", type=int, default=32, help="Параллельных апдейтов")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Задержка фейкового API, мс")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+async def run(args: argparse.Namespace) -> List[ScenarioResult]:
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Неизвестные сценарии: {', '.join(unknown)}")
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="tg_bot_bench_")
+    ctx = BenchContext(args, workdir)
+    try:
+        await ctx.setup()
+        return [await SCENARIOS[name](ctx) for name in names]
+    finally:
+        await ctx.teardown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps([result.as_dict() for result in results], ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,37 @@
 import os
+import html
 import json
+import time
+import asyncio
 import logging
+from functools import partial
+from itertools import islice
 from typing import Dict, List, Tuple, Optional
-from dotenv import load_dotenv
+from dotenv import load_dotenv, dotenv_values
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.types import (
     Message,
     CallbackQuery,
     InlineQuery,
     InlineQueryResultVoice,
+    ChosenInlineResult,
     ReplyKeyboardMarkup,
     KeyboardButton,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
-    ReplyKeyboardRemove
+    ReplyKeyboardRemove,
+    BufferedInputFile
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
 from aiogram.client.default import DefaultBotProperties
 
 # Мои импорты
-from video_processor import convert_video_to_voice
+from video_processor import convert_video_to_voice, FFmpegError
 from access_control import AccessControl
 from keyboards import (
     get_main_keyboard,
@@ -31,29 +39,60 @@ from keyboards import (
     get_admin_management_keyboard,
     get_speaker_management_keyboard,
     get_voices_keyboard,
-    get_access_request_keyboard
+    get_access_request_keyboard,
+    get_access_digest_keyboard,
+    get_multiselect_keyboard,
+    get_tag_voices_keyboard,
+    TAGS_PAGE_SIZE,
+    get_confirm_keyboard,
+    MULTISELECT_PAGE_SIZE
 )
-from states import RenameStates, AccessStates, AdminStates
-from voice_storage import VoiceStorage
+from states import RenameStates, BatchStates, TagStates, AccessStates, AdminStates
+from voice_storage import VoiceStorage, VoiceMeta, voice_key, read_voices_file, write_atomic, VOICES_FILE, MAX_TITLE_LENGTH
+from voice_search import parse_query, search, recent_page
+from meta_backfill import backfill_metadata
+from voice_usage import VoiceUsage, PAGE_SIZE
+from log_pipeline import setup_logging, LogChannelSink, ADMIN_ACTION
+from access_requests import AccessRequestQueue, AccessDigest, format_digest
+from file_watcher import FileWatcher
+from health_check import FileHealthChecker
+from inline_throttle import InlineThrottleMiddleware
+from voice_fingerprint import DuplicateDetector
+from lifecycle import Lifecycle
+from profiler import Profiler
+from voice_editor import EditError, check_concat_parts, parse_seconds, parse_speed, trim, change_speed, concat
+from bot_files import make_session, can_download, download_bytes, PUBLIC_DOWNLOAD_LIMIT
 
 # Загрузка конфигурации
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
 
-# Настройка логгирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("bot.log"), logging.StreamHandler()]
-)
+# Настройка логгирования (запись в файл и канал идёт вне event loop)
+log_sink = LogChannelSink() if LOG_CHANNEL_ID else None
+log_listener = setup_logging(log_sink)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# BOT_API_SERVER в .env - собственный Bot API сервер (без лимита 20 МБ, см. bot_files.py)
+bot = Bot(token=BOT_TOKEN, session=make_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
+inline_throttle = InlineThrottleMiddleware()  # Лимиты и склейка инлайн-запросов на пользователя
+dp.inline_query.outer_middleware(inline_throttle)
+lifecycle = Lifecycle(dp)  # SIGTERM: дождаться начатых обработчиков и только потом выходить
+profiler = Profiler(dp)  # /profile: время обработчиков, семплы стеков, лаг event loop
 SUPER_ADMIN = int(os.getenv("SUPER_ADMIN"))
 storage = VoiceStorage()  # Инициализация хранилища голосовых
+usage = VoiceUsage()  # Статистика выбора голосовых в инлайне
+access_requests = AccessRequestQueue()  # Заявки на доступ
+access_digest = AccessDigest(access_requests)
+file_watcher = FileWatcher()  # Подхватывает ручные правки voices.json и .env
+health_checker = FileHealthChecker(storage)  # Проверка, что file_id ещё живы
+duplicate_detector = DuplicateDetector(storage)  # Поиск похожих по звучанию голосовых
+
+ENV_FILE = ".env"
+ROLE_ENV_KEYS = ("SUPER_ADMIN", "ADMIN_IDS", "USER_IDS")
+RELOAD_ATTEMPTS = 3  # Сколько раз перечитать voices.json, если бот писал в него во время чтения
 
 # Состояния FSM
 def get_admins():
@@ -70,17 +109,24 @@ class AdminStates(StatesGroup):
     waiting_admin_id = State()
     waiting_speaker_id = State()
     
+def append_limited(text: str, lines: List[str], limit: int = 4000) -> str:
+    """Дописывает строки, пока сообщение влезает в лимит Telegram (4096), остальное - '…и ещё N'"""
+    for index, line in enumerate(lines):
+        if len(text) + len(line) + 1 > limit:
+            return f"{text}\n…и ещё {len(lines) - index}"
+        text = f"{text}\n{line}"
+    return text
+
+def write_env_file(lines: List[str]):
+    """Пишет .env целиком через временный файл: при остановке посреди записи старый .env не портится"""
+    write_atomic(ENV_FILE, "".join(lines))
+
 def update_env_file(key: str, value: str):
     """Обновляет значение в .env файле"""
     with open('.env', 'r') as f:
         lines = f.readlines()
-    
-    with open('.env', 'w') as f:
-        for line in lines:
-            if line.startswith(key):
-                f.write(f"{key}={value}\n")
-            else:
-                f.write(line)
+
+    write_env_file([f"{key}={value}\n" if line.startswith(key) else line for line in lines])
 
 # ==============================================
 # Основные обработчики команд
@@ -96,6 +142,105 @@ async def admin_panel(message: Message):
         reply_markup=get_admin_main_keyboard()
     )
 
+@dp.message(Command("profile"))
+async def cmd_profile(message: Message):
+    if message.from_user.id != SUPER_ADMIN:
+        return
+
+    if profiler.running:
+        await message.answer("⚠️ Профиль уже собирается")
+        return
+
+    args = (message.text or "").split()
+    seconds = int(args[1]) if len(args) > 1 and args[1].isdecimal() else 30
+    await message.answer(f"📈 Собираю профиль {seconds} с...")
+    report = await profiler.run(seconds)
+    logger.info(f"Снят профиль за {seconds} с", extra=ADMIN_ACTION)
+    await message.answer(report.text[:4000], parse_mode=None)
+    if report.collapsed:
+        await message.answer_document(
+            BufferedInputFile(report.collapsed, filename=f"profile_{int(time.time())}.folded"),
+            caption="Collapsed stacks: flamegraph.pl, speedscope.app или inferno"
+        )
+
+@dp.message(Command("backfill_meta"))
+async def cmd_backfill_meta(message: Message):
+    if message.from_user.id != SUPER_ADMIN:
+        return
+
+    missing = len(storage.missing_meta())
+    if not missing:
+        await message.answer("✅ У всех голосовых уже есть метаданные")
+        return
+
+    await message.answer(f"🔄 Догружаю метаданные для {missing} голосовых...")
+    updated = await backfill_metadata(bot, storage)
+    await message.answer(f"✅ Метаданные обновлены: {updated} из {missing}")
+
+@dp.message(Command("check_voices"))
+async def cmd_check_voices(message: Message):
+    if message.from_user.id != SUPER_ADMIN:
+        return
+
+    await message.answer(f"🔄 Проверяю file_id ({len(health_checker.stale())} давно не проверялись)...")
+    checked, dead, released = await health_checker.check(bot)
+    await message.answer(append_limited(
+        f"✅ Проверено: {checked}, новых недоступных: {len(dead)}, вернулись из карантина: {len(released)}\n"
+        f"В карантине всего: {len(storage.quarantined)}",
+        [f"⚠️ {html.escape(title)}" for title in dead] + [f"♻️ {html.escape(title)}" for title in released]
+    ))
+
+@dp.message(Command("scan_duplicates"))
+async def cmd_scan_duplicates(message: Message):
+    if message.from_user.id != SUPER_ADMIN:
+        return
+
+    if not duplicate_detector.enabled:
+        await message.answer("⚠️ Для поиска похожих нужны numpy и ffmpeg")
+        return
+
+    await message.answer(f"🔄 Ищу похожие голосовые (без отпечатка: {len(storage.voices) - len(duplicate_detector.index)})...")
+    computed, groups = await duplicate_detector.scan(bot)
+    report = append_limited(
+        f"✅ Новых отпечатков: {computed}, групп похожих: {len(groups)}",
+        ["• " + " ≈ ".join(titles) for titles in groups]
+    )
+    await message.answer(report, parse_mode=None)
+
+@dp.message(Command("inline_stats"))
+async def cmd_inline_stats(message: Message):
+    if message.from_user.id != SUPER_ADMIN:
+        return
+
+    stats = inline_throttle.stats
+    await message.answer(
+        "📊 Инлайн-запросы с запуска:\n"
+        f"Получено: {stats['received']}\n"
+        f"Обработано: {stats['processed']}\n"
+        f"Склеено (набор текста): {stats['coalesced']}\n"
+        f"Отменено новым запросом: {stats['cancelled']}\n"
+        f"Отброшено лимитом: {stats['dropped']}"
+    )
+
+async def notify_voice_health(dead: List[str], released: List[str]):
+    """Сообщает SUPER_ADMIN о голосовых, ушедших в карантин или вернувшихся из него"""
+    parts = []
+    if dead:
+        parts.append(append_limited(
+            "⚠️ Эти голосовые больше недоступны и скрыты из инлайна (удалить - «☑️ Выбрать несколько»):",
+            [f"• {title}" for title in dead]
+        ))
+    if released:
+        parts.append(append_limited(
+            "♻️ Эти голосовые снова доступны и вернулись в инлайн:",
+            [f"• {title}" for title in released]
+        ))
+    try:
+        for text in parts:
+            await bot.send_message(SUPER_ADMIN, text, parse_mode=None)
+    except Exception as e:
+        logger.error(f"Не удалось отправить отчёт о проверке: {e}")
+
 @dp.message(CommandStart())
 async def cmd_start(message: Message):
     if AccessControl.is_admin(message.from_user.id):
@@ -137,11 +282,58 @@ async def get_user_display_info(user_id: int) -> str:
     except Exception:
         return f"ID: {user_id}"
 
+def format_duration(file_id: str) -> str:
+    meta = storage.get_meta(file_id)
+    return f" ({meta.duration} с)" if meta and meta.duration is not None else ""
+
+async def reply_similar(message: Message, titles: List[str]) -> None:
+    """Ответ на присланное голосовое/видео, когда фоновая проверка нашла похожие по звучанию"""
+    await message.reply("🔁 Похоже на: " + ", ".join(html.escape(title) for title in titles[:5]))
+
 def reload_env_vars():
     """Принудительно перезагружает переменные окружения"""
     global SUPER_ADMIN
     load_dotenv(override=True)
     SUPER_ADMIN = int(os.getenv("SUPER_ADMIN"))
+    AccessControl.load_ids()
+
+async def reload_voices_file() -> bool:
+    """Перечитывает voices.json вне event loop и применяет только разницу.
+    Если бот сам изменил список, пока файл читался, снимок устарел - читаем заново"""
+    for _ in range(RELOAD_ATTEMPTS):
+        generation = storage.generation
+        try:
+            voices = await asyncio.to_thread(read_voices_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"voices.json не перечитан: {e}")
+            return False
+        if storage.generation == generation:
+            break
+    else:
+        logger.warning("voices.json не перечитан: бот менял список во время каждого чтения")
+        return False
+
+    added, removed, changed = storage.apply_snapshot(voices)
+    if added or removed or changed:
+        logger.info(f"voices.json изменён вручную: +{added} -{removed} ~{changed}", extra=ADMIN_ACTION)
+    return True
+
+async def reload_env_file() -> bool:
+    """Перечитывает .env вне event loop и обновляет роли"""
+    global SUPER_ADMIN
+    env = await asyncio.to_thread(dotenv_values, ENV_FILE)
+    if not env.get("SUPER_ADMIN"):
+        logger.warning(".env не перечитан: нет SUPER_ADMIN")
+        return False
+
+    for key in ROLE_ENV_KEYS:
+        os.environ[key] = env.get(key) or ""
+    changes = AccessControl.apply_env(env)
+    SUPER_ADMIN = int(env["SUPER_ADMIN"])
+    if any(changes.values()):
+        summary = ", ".join(f"{name}={count}" for name, count in changes.items() if count)
+        logger.info(f".env изменён вручную: {summary}", extra=ADMIN_ACTION)
+    return True
 
 # ==============================================
 # Обработчики для управления голосовыми
@@ -156,7 +348,10 @@ async def list_voices(message: Message):
         await message.answer("Нет сохранённых сообщений", reply_markup=get_main_keyboard())
         return
     
-    voices_list = "\n".join(f"🔹 {title}" for title in storage.voices)
+    voices_list = "\n".join(
+        f"{'⚠️' if storage.is_quarantined(file_id) else '🔹'} {title}{format_duration(file_id)}"
+        for title, file_id in storage.voices.items()
+    )
     await message.answer(
         f"📋 Сохранённые сообщения ({len(storage.voices)}):\n\n{voices_list}",
         reply_markup=get_main_keyboard()
@@ -190,6 +385,31 @@ async def delete_voice_start(message: Message):
         reply_markup=get_voices_keyboard("delete")
     )
 
+@dp.message(F.text == "🏷 Теги")
+async def tags_start(message: Message):
+    if not AccessControl.is_admin(message.from_user.id):
+        return
+    
+    if not storage.voices:
+        await message.answer("Нет сообщений для тегов", reply_markup=get_main_keyboard())
+        return
+    
+    counts = sorted(storage.tag_counts().items(), key=lambda item: item[1], reverse=True)
+    tags_list = ", ".join(f"#{html.escape(tag)} ({count})" for tag, count in counts[:50]) or "пока нет"
+    await message.answer(
+        f"🏷 Теги: {tags_list}\n\n"
+        "В инлайне: @бот #тег или #тег1 #тег2\n"
+        "Выберите сообщение, чтобы задать теги:",
+        reply_markup=tags_keyboard(0)
+    )
+
+def tags_keyboard(page: int) -> InlineKeyboardMarkup:
+    """Страница выбора голосового для тегов (названия берутся по порядку библиотеки)"""
+    pages = max(1, (len(storage.voices) + TAGS_PAGE_SIZE - 1) // TAGS_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    voices = islice(storage.get_all_voices(), page * TAGS_PAGE_SIZE, (page + 1) * TAGS_PAGE_SIZE)
+    return get_tag_voices_keyboard([(title, voice_key(file_id)) for title, file_id in voices], page, pages)
+
 @dp.message(F.text == "🔄 Обновить меню")
 async def refresh_menu(message: Message):
     if not AccessControl.is_admin(message.from_user.id):
@@ -207,8 +427,10 @@ async def handle_voice(message: Message):
         return
     
     title = f"Голосовое {len(storage.voices) + 1}"
-    if storage.save_voice(title, message.voice.file_id):
+    meta = VoiceMeta.from_voice(message.voice, message.from_user.id)
+    if storage.save_voice(title, message.voice.file_id, meta):
         await message.reply(f"✅ Сохранено как: {title}", reply_markup=get_main_keyboard())
+        duplicate_detector.check_in_background(bot, message.voice.file_id, partial(reply_similar, message))
     else:
         await message.reply("⚠️ Это сообщение уже было сохранено ранее", reply_markup=get_main_keyboard())
 
@@ -217,12 +439,22 @@ async def handle_video(message: Message):
     if not AccessControl.is_admin(message.from_user.id):
         return
     
+    video = message.video or message.video_note
+    if not can_download(bot, video.file_size):
+        await message.reply(
+            f"⚠️ Видео больше {PUBLIC_DOWNLOAD_LIMIT // 1024 // 1024} МБ, публичный Bot API его не отдаст. "
+            "Нужен свой Bot API сервер (BOT_API_SERVER в .env)"
+        )
+        return
+
     try:
         await message.reply("🔄 Конвертирую видео в голосовое...")
-        if file_id := await convert_video_to_voice(message):
+        if voice := await convert_video_to_voice(message):
             title = f"Видео-аудио {len(storage.voices) + 1}"
-            if storage.save_voice(title, file_id):
+            meta = VoiceMeta.from_voice(voice, message.from_user.id)
+            if storage.save_voice(title, voice.file_id, meta):
                 await message.reply(f"✅ Сохранено как: {title}")
+                duplicate_detector.check_in_background(bot, voice.file_id, partial(reply_similar, message))
             else:
                 await message.reply("⚠️ Это сообщение уже было сохранено ранее")
     except Exception as e:
@@ -256,11 +488,66 @@ async def delete_voice_callback(callback: types.CallbackQuery):
 
     title = callback.data.split(":")[1]
     if storage.delete_voice(title):
+        logger.info(f"{callback.from_user.id} удалил голосовое '{title}'", extra=ADMIN_ACTION)
         await callback.message.answer(f"✅ Сообщение '{title}' удалено", reply_markup=get_main_keyboard())
     else:
         await callback.message.answer("❌ Не удалось удалить сообщение", reply_markup=get_main_keyboard())
     await callback.answer()
 
+@dp.callback_query(F.data.startswith("tags:"))
+async def tags_voice_callback(callback: types.CallbackQuery, state: FSMContext):
+    if not AccessControl.is_admin(callback.from_user.id):
+        await callback.answer("🚫 Нет доступа", show_alert=True)
+        return
+
+    parts = callback.data.split(":")
+    kind, value = (parts[1], parts[2]) if len(parts) == 3 else ("", "")  # Старые кнопки с названием - мимо
+    if kind == "p" and value.lstrip("-").isdecimal():
+        try:
+            await callback.message.edit_reply_markup(reply_markup=tags_keyboard(int(value)))
+        except TelegramBadRequest:
+            pass  # Клавиатура не изменилась
+        await callback.answer()
+        return
+
+    voice = storage.get_by_key(value) if kind == "v" else None
+    if voice is None:
+        await callback.answer("❌ Сообщение не найдено", show_alert=True)
+        return
+    title, file_id = voice
+
+    current = " ".join(f"#{html.escape(tag)}" for tag in storage.get_tags(file_id)) or "нет"
+    await state.update_data(tags_title=title)
+    await callback.message.answer(
+        f"Теги '{html.escape(title)}': {current}\n"
+        "Введите новые теги через пробел или запятую (заменят текущие), '-' чтобы убрать все:\n"
+        "(Или отправьте /cancel для отмены)"
+    )
+    await callback.answer()
+    await state.set_state(TagStates.waiting_for_tags)
+
+@dp.message(TagStates.waiting_for_tags)
+async def handle_new_tags(message: Message, state: FSMContext):
+    data = await state.get_data()
+    title = data.get('tags_title')
+    await state.clear()
+
+    if not message.text or message.text.startswith('/'):
+        await message.reply("❌ Изменение тегов отменено", reply_markup=get_main_keyboard())
+        return
+
+    raw = [] if message.text.strip() == "-" else message.text.replace(",", " ").split()
+    tags = storage.set_tags(title, raw)
+    if tags is None:
+        await message.reply("❌ Сообщение было удалено", reply_markup=get_main_keyboard())
+        return
+
+    logger.info(f"{message.from_user.id} задал теги '{title}': {tags}", extra=ADMIN_ACTION)
+    await message.reply(
+        f"✅ Теги '{html.escape(title)}': {' '.join(f'#{html.escape(tag)}' for tag in tags) or 'нет'}",
+        reply_markup=get_main_keyboard()
+    )
+
 @dp.message(RenameStates.waiting_for_new_title)
 async def handle_new_title(message: Message, state: FSMContext):
     if message.text.startswith('/'):
@@ -281,6 +568,7 @@ async def handle_new_title(message: Message, state: FSMContext):
         return
 
     if storage.rename_voice(old_title, new_title):
+        logger.info(f"{message.from_user.id} переименовал '{old_title}' в '{new_title}'", extra=ADMIN_ACTION)
         await message.reply(
             f"✅ Успешно переименовано с '{old_title}' на '{new_title}'",
             reply_markup=get_main_keyboard()
@@ -295,10 +583,255 @@ async def handle_new_title(message: Message, state: FSMContext):
 
     await state.clear()
 
+# ==============================================
+# Пакетные операции (множественный выбор)
+# ==============================================
+
+MULTISELECT_HINT = (
+    "☑️ Отметьте сообщения кнопками или пришлите текст - "
+    "отмечу все, в названии которых он есть.\n"
+    "/cancel - выйти"
+)
+
+@dp.message(F.text == "☑️ Выбрать несколько")
+async def batch_start(message: Message, state: FSMContext):
+    if not AccessControl.is_admin(message.from_user.id):
+        return
+
+    if not storage.voices:
+        await message.answer("Нет сохранённых сообщений", reply_markup=get_main_keyboard())
+        return
+
+    # Снимок названий: в кнопках индексы из него, а не сами названия
+    titles = list(storage.voices)
+    await state.set_state(BatchStates.selecting)
+    await state.update_data(batch_titles=titles, batch_selected=[], batch_page=0)
+    await message.answer(MULTISELECT_HINT, reply_markup=get_multiselect_keyboard(titles, set(), 0))
+
+@dp.callback_query(BatchStates.selecting, F.data.startswith("ms:"))
+async def batch_callback(callback: CallbackQuery, state: FSMContext):
+    if not AccessControl.is_admin(callback.from_user.id):
+        await callback.answer("🚫 Нет доступа", show_alert=True)
+        return
+
+    data = await state.get_data()
+    titles = data["batch_titles"]
+    selected = set(data["batch_selected"])
+    page = data["batch_page"]
+    _, action, *args = callback.data.split(":")
+
+    if action == "t":
+        selected ^= {int(args[0])}
+    elif action == "p":
+        pages = max(1, (len(titles) + MULTISELECT_PAGE_SIZE - 1) // MULTISELECT_PAGE_SIZE)
+        page = min(max(int(args[0]), 0), pages - 1)
+    elif action == "a":
+        start = int(args[0]) * MULTISELECT_PAGE_SIZE
+        selected.update(range(start, min(start + MULTISELECT_PAGE_SIZE, len(titles))))
+    elif action == "n":
+        selected.clear()
+    elif action == "x":
+        await state.clear()
+        await callback.message.edit_text("Выбор закрыт")
+        await callback.answer()
+        return
+    elif action in ("del", "ren") and not selected:
+        await callback.answer("Ничего не выбрано", show_alert=True)
+        return
+    elif action == "del":
+        await callback.message.edit_text(
+            f"🗑 Удалить {len(selected)} сообщений?",
+            reply_markup=get_confirm_keyboard("ms:confirm")
+        )
+        await callback.answer()
+        return
+    elif action == "confirm" and args[0] == "yes":
+        deletes = [titles[idx] for idx in sorted(selected) if titles[idx] in storage.voices]
+        await state.clear()
+        if storage.apply_batch(deletes=deletes):
+            logger.info(f"{callback.from_user.id} удалил пачкой {len(deletes)} голосовых", extra=ADMIN_ACTION)
+            await callback.message.edit_text(f"✅ Удалено сообщений: {len(deletes)}")
+        else:
+            await callback.message.edit_text("❌ Не удалось удалить, список изменился. Откройте выбор заново")
+        await callback.answer()
+        return
+    elif action == "ren":
+        await state.set_state(BatchStates.waiting_for_pattern)
+        await callback.message.answer(
+            f"Введите шаблон названия для {len(selected)} сообщений.\n"
+            "{n} заменится на номер по порядку, например: Смех {n}\n"
+            "Без {n} номер добавится в конец.\n"
+            "(Или отправьте /cancel для отмены)"
+        )
+        await callback.answer()
+        return
+
+    await state.update_data(batch_selected=sorted(selected), batch_page=page)
+    try:
+        await callback.message.edit_text(
+            MULTISELECT_HINT,
+            reply_markup=get_multiselect_keyboard(titles, selected, page)
+        )
+    except TelegramBadRequest:
+        pass  # Клавиатура не изменилась
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("ms:"))
+async def batch_callback_expired(callback: CallbackQuery):
+    await callback.answer("Выбор устарел, откройте его заново", show_alert=True)
+
+@dp.message(BatchStates.selecting)
+async def batch_select_by_search(message: Message, state: FSMContext):
+    if not message.text or message.text.startswith('/'):
+        await state.clear()
+        await message.answer("Выбор закрыт", reply_markup=get_main_keyboard())
+        return
+
+    data = await state.get_data()
+    titles = data["batch_titles"]
+    selected = set(data["batch_selected"])
+    needle = message.text.strip().lower()
+    matched = {idx for idx, title in enumerate(titles) if needle in title.lower()}
+    selected |= matched
+
+    await state.update_data(batch_selected=sorted(selected))
+    await message.answer(
+        f"Отмечено по запросу: {len(matched)}, всего выбрано: {len(selected)}\n\n{MULTISELECT_HINT}",
+        reply_markup=get_multiselect_keyboard(titles, selected, data["batch_page"])
+    )
+
+@dp.message(BatchStates.waiting_for_pattern)
+async def batch_rename_pattern(message: Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    if not message.text or message.text.startswith('/'):
+        await message.answer("❌ Переименование отменено", reply_markup=get_main_keyboard())
+        return
+
+    pattern = message.text.strip()
+    if "{n}" not in pattern:
+        pattern += " {n}"
+
+    titles = data["batch_titles"]
+    sources = [titles[idx] for idx in data["batch_selected"] if titles[idx] in storage.voices]
+    renames = {title: pattern.replace("{n}", str(number)) for number, title in enumerate(sources, start=1)}
+
+    if storage.apply_batch(renames=renames):
+        logger.info(f"{message.from_user.id} переименовал пачкой {len(renames)} голосовых", extra=ADMIN_ACTION)
+        await message.answer(f"✅ Переименовано сообщений: {len(renames)}", reply_markup=get_main_keyboard())
+    else:
+        await message.answer(
+            "❌ Ничего не переименовано. Возможные причины:\n"
+            f"- Название длиннее {MAX_TITLE_LENGTH} символов\n"
+            "- Такие названия уже есть у других сообщений",
+            reply_markup=get_main_keyboard()
+        )
+
+# ==============================================
+# Правка голосовых (обрезка, склейка, скорость)
+# ==============================================
+
+EDIT_USAGE = (
+    "✂️ Правка голосовых:\n"
+    "/trim Название | начало | конец - обрезать (время в секундах или м:сс, конец можно не писать)\n"
+    "/speed Название | 1.25 - ускорить/замедлить (0.25...4)\n"
+    "/concat Новое название | Первое | Второе | ... - склеить в новое\n\n"
+    "В /trim и /speed последним можно дописать | Новое название - тогда исходник останется"
+)
+
+def parse_edit_args(message: Message) -> List[str]:
+    """Аргументы команды правки, разделённые |"""
+    _, _, rest = (message.text or "").partition(" ")
+    return [arg.strip() for arg in rest.split("|")] if rest.strip() else []
+
+async def save_edited_voice(message: Message, data: bytes, title: str, new_title: Optional[str], note: str):
+    """Загружает результат правки и подменяет исходник либо сохраняет под new_title"""
+    if new_title is not None and (not new_title or len(new_title) > MAX_TITLE_LENGTH or new_title in storage.voices):
+        await message.answer(f"❌ Новое название пустое, длиннее {MAX_TITLE_LENGTH} символов или уже занято", parse_mode=None)
+        return
+
+    sent = await bot.send_voice(
+        message.chat.id,
+        BufferedInputFile(data, filename="edited.ogg"),
+        caption=note,
+        disable_notification=True
+    )
+    meta = VoiceMeta.from_voice(sent.voice, message.from_user.id)
+    if new_title is None:
+        saved = storage.replace_file(title, sent.voice.file_id, meta)
+        result = f"✅ «{title}» заменено"
+    else:
+        saved = storage.save_voice(new_title, sent.voice.file_id, meta)
+        result = f"✅ Сохранено как «{new_title}»"
+    if saved:
+        logger.info(f"{message.from_user.id} отредактировал '{title}': {note}", extra=ADMIN_ACTION)
+        await message.answer(result, parse_mode=None)
+    else:
+        await message.answer("⚠️ Не удалось сохранить: исходник удалён или такой файл уже есть", parse_mode=None)
+
+@dp.message(Command("trim", "speed", "concat"))
+async def cmd_edit_voice(message: Message, command: CommandObject):
+    if not AccessControl.is_admin(message.from_user.id):
+        return
+
+    args = parse_edit_args(message)
+    if len(args) < 2:
+        await message.answer(EDIT_USAGE, parse_mode=None)
+        return
+
+    try:
+        if command.command == "concat":
+            new_title, sources = args[0], args[1:]
+            check_concat_parts(len(sources))  # До скачивания, а не после
+            missing = [title for title in sources if title not in storage.voices]
+            if missing:
+                raise EditError(f"Нет голосовых: {', '.join(missing)}")
+            parts = [await download_bytes(bot, storage.voices[title]) for title in sources]
+            data, copied = await concat(parts)
+            await save_edited_voice(message, data, " + ".join(sources), new_title, f"склейка{' (без перекодирования)' if copied else ''}")
+            return
+
+        title = args[0]
+        if title not in storage.voices:
+            raise EditError(f"Нет голосового «{title}»")
+        source = await download_bytes(bot, storage.voices[title])
+        if command.command == "trim":
+            start = parse_seconds(args[1])
+            end = parse_seconds(args[2]) if len(args) > 2 and args[2] else None
+            new_title = args[3] if len(args) > 3 else None
+            data, copied = await trim(source, start, end)
+            note = f"обрезка {args[1]}–{args[2] if end is not None else 'конец'}{' (без перекодирования)' if copied else ''}"
+        else:
+            factor = parse_speed(args[1])
+            new_title = args[2] if len(args) > 2 else None
+            data = await change_speed(source, factor)
+            note = f"скорость ×{factor:g}"
+        await save_edited_voice(message, data, title, new_title, note)
+    except EditError as e:
+        await message.answer(f"❌ {e}", parse_mode=None)
+    except FFmpegError as e:
+        logger.error(f"Ошибка ffmpeg при правке: {e}")
+        await message.answer("⚠️ ffmpeg не смог обработать файл")
+    except TelegramAPIError as e:
+        # Скачивание исходника или отправка результата: файл больше лимита, file_id протух и т.п.
+        logger.error(f"Ошибка Bot API при правке: {e}")
+        await message.answer(f"⚠️ Telegram не принял запрос: {e.message}", parse_mode=None)
+
 # ==============================================
 # Инлайн-режим
 # ==============================================
 
+def voice_result(title: str, file_id: str) -> InlineQueryResultVoice:
+    # id = ключ голосового, чтобы chosen_inline_result знал, что выбрали
+    meta = storage.get_meta(file_id)
+    return InlineQueryResultVoice(
+        id=voice_key(file_id),
+        voice_file_id=file_id,
+        title=title,
+        voice_url="",
+        voice_duration=meta.duration if meta else None
+    )
+
 @dp.inline_query()
 async def inline_voices(query: InlineQuery):
     if not AccessControl.is_user(query.from_user.id):
@@ -310,27 +843,107 @@ async def inline_voices(query: InlineQuery):
         )
         return
 
-    search_query = query.query.strip().lower()
-    results = []
-
-    for idx, (title, file_id) in enumerate(storage.get_all_voices()):
-        if search_query and not title.lower().startswith(search_query):
-            continue
+    search_query = parse_query(query.query)
 
-        results.append(
-            InlineQueryResultVoice(
-                id=str(idx),
-                voice_file_id=file_id,
-                title=title,
-                voice_url=""
-            )
-        )
-
-        if len(results) >= 50:
-            break
+    if search_query.is_empty:
+        # Пустой запрос: сначала свои недавние и популярные, затем остальные по порядку
+        voices = recent_page(storage, usage.ranked_keys(query.from_user.id), PAGE_SIZE)
+    else:
+        voices = search(storage, search_query, PAGE_SIZE)
+    results = [voice_result(title, file_id) for title, file_id in voices]
 
     await query.answer(results, cache_time=0, is_personal=True)
+
+@dp.chosen_inline_result()
+async def chosen_voice(result: ChosenInlineResult):
+    """Учитывает выбранное голосовое (нужен /setinlinefeedback в BotFather)"""
+    usage.record(result.from_user.id, result.result_id)
     
+# ======================
+# Заявки на доступ
+# ======================
+
+@dp.callback_query(F.data == "request_access")
+async def request_access(callback: CallbackQuery, state: FSMContext):
+    user_id = callback.from_user.id
+    if AccessControl.is_user(user_id):
+        await callback.answer("✅ У вас уже есть доступ", show_alert=True)
+        return
+
+    if refusal := access_requests.check(user_id):
+        await callback.answer(refusal, show_alert=True)
+        return
+
+    await callback.message.answer(
+        "Напишите, кто вы и зачем нужен доступ:\n"
+        "(Или отправьте /cancel для отмены)"
+    )
+    await callback.answer()
+    await state.set_state(AccessStates.waiting_for_access_reason)
+
+@dp.message(AccessStates.waiting_for_access_reason)
+async def handle_access_reason(message: Message, state: FSMContext):
+    if not message.text or message.text.startswith('/'):
+        await state.clear()
+        await message.answer("❌ Заявка отменена")
+        return
+
+    user = message.from_user
+    name = f"@{user.username}" if user.username else user.full_name
+    if access_requests.add(user.id, name, message.text.strip()):
+        access_digest.notify()
+        await message.answer("📨 Заявка отправлена, ждите решения администратора")
+    else:
+        await message.answer(access_requests.check(user.id) or "❌ Не удалось отправить заявку")
+    await state.clear()
+
+@dp.callback_query(F.data.startswith("approve:") | F.data.startswith("reject:"))
+async def access_decision_callback(callback: CallbackQuery):
+    if callback.from_user.id != SUPER_ADMIN:
+        await callback.answer("🚫 Нет доступа", show_alert=True)
+        return
+
+    action, user_id = callback.data.split(":")
+    user_id = int(user_id)
+
+    if action == "approve":
+        request = access_requests.approve(user_id)
+        if request:
+            users = get_users()
+            if user_id not in users:
+                users.append(user_id)
+                update_users(users)
+                reload_env_vars()
+            logger.info(f"Одобрена заявка на доступ {user_id}", extra=ADMIN_ACTION)
+            notice = "✅ Ваша заявка одобрена, теперь доступен инлайн-режим"
+    else:
+        request = access_requests.reject(user_id)
+        if request:
+            logger.info(f"Отклонена заявка на доступ {user_id}", extra=ADMIN_ACTION)
+            notice = "❌ Ваша заявка на доступ отклонена"
+
+    if request:
+        await callback.answer(f"{'Одобрено' if action == 'approve' else 'Отклонено'}: {request['name']}")
+        try:
+            await bot.send_message(user_id, notice)
+        except Exception as e:
+            logger.warning(f"Не удалось уведомить {user_id} о решении по заявке: {e}")
+    else:
+        await callback.answer("Заявка уже обработана")
+
+    # Обновляем дайджест вместо отправки нового сообщения
+    try:
+        if access_requests.pending:
+            await callback.message.edit_text(
+                format_digest(access_requests),
+                parse_mode=None,
+                reply_markup=get_access_digest_keyboard(access_requests.oldest())
+            )
+        else:
+            await callback.message.edit_text("✅ Все заявки обработаны")
+    except Exception:
+        pass  # Сообщение не изменилось
+
 # ======================
 # Управление админами
 # ======================
@@ -376,17 +989,18 @@ def update_admins(admin_ids: list[int]):
         lines = f.readlines()
     
     # Перезаписываем файл, обновляя только ADMIN_IDS
-    with open('.env', 'w') as f:
-        admin_updated = False
-        for line in lines:
-            if line.startswith("ADMIN_IDS="):
-                f.write(f"ADMIN_IDS={admins_str}\n")
-                admin_updated = True
-            elif not line.strip().startswith("#") and "=" in line:  # Сохраняем другие переменные
-                f.write(line)
-        
-        if not admin_updated:
-            f.write(f"ADMIN_IDS={admins_str}\n")
+    new_lines = []
+    admin_updated = False
+    for line in lines:
+        if line.startswith("ADMIN_IDS="):
+            new_lines.append(f"ADMIN_IDS={admins_str}\n")
+            admin_updated = True
+        elif not line.strip().startswith("#") and "=" in line:  # Сохраняем другие переменные
+            new_lines.append(line)
+
+    if not admin_updated:
+        new_lines.append(f"ADMIN_IDS={admins_str}\n")
+    write_env_file(new_lines)
 
 @dp.message(F.text == "➕ Добавить админа")
 async def add_admin_start(message: Message, state: FSMContext):
@@ -429,6 +1043,7 @@ async def add_admin_finish(message: Message, state: FSMContext):
         admins.append(user_id)
         update_admins(admins)
         reload_env_vars()  # Перезагружаем переменные
+        logger.info(f"Добавлен администратор {user_id}", extra=ADMIN_ACTION)
         
         user_info = await get_user_display_info(user_id)
         await message.answer(
@@ -481,6 +1096,7 @@ async def remove_admin_callback(callback: CallbackQuery):
             admins.remove(admin_id)
             update_admins(admins)
             reload_env_vars()  # Перезагружаем переменные
+            logger.info(f"Удалён администратор {admin_id}", extra=ADMIN_ACTION)
             
             user_info = await get_user_display_info(admin_id)
             await callback.message.edit_text(f"✅ {user_info} удален из администраторов")
@@ -536,17 +1152,18 @@ def update_users(user_ids: list[int]):
     with open('.env', 'r') as f:
         lines = f.readlines()
     
-    with open('.env', 'w') as f:
-        users_updated = False
-        for line in lines:
-            if line.startswith("USER_IDS="):
-                f.write(f"USER_IDS={users_str}\n")
-                users_updated = True
-            elif not line.strip().startswith("#") and "=" in line:
-                f.write(line)
-        
-        if not users_updated:
-            f.write(f"USER_IDS={users_str}\n")
+    new_lines = []
+    users_updated = False
+    for line in lines:
+        if line.startswith("USER_IDS="):
+            new_lines.append(f"USER_IDS={users_str}\n")
+            users_updated = True
+        elif not line.strip().startswith("#") and "=" in line:
+            new_lines.append(line)
+
+    if not users_updated:
+        new_lines.append(f"USER_IDS={users_str}\n")
+    write_env_file(new_lines)
 
 @dp.message(F.text == "➕ Добавить говоруна")
 async def add_speaker_start(message: Message, state: FSMContext):
@@ -588,6 +1205,7 @@ async def add_speaker_finish(message: Message, state: FSMContext):
         users.append(user_id)
         update_users(users)
         reload_env_vars()  # Перезагружаем переменные
+        logger.info(f"Добавлен говорун {user_id}", extra=ADMIN_ACTION)
         
         user_info = await get_user_display_info(user_id)
         await message.answer(
@@ -640,6 +1258,7 @@ async def remove_speaker_callback(callback: CallbackQuery):
             users.remove(user_id)
             update_users(users)
             reload_env_vars()  # Перезагружаем переменные
+            logger.info(f"Удалён говорун {user_id}", extra=ADMIN_ACTION)
             
             user_info = await get_user_display_info(user_id)
             await callback.message.edit_text(f"✅ {user_info} удален из говорунов")
@@ -681,8 +1300,38 @@ async def back_to_main_menu(message: Message):
 # ======================
 
 async def main():
-    await dp.start_polling(bot)
+    if removed := lifecycle.clean_temp():
+        logger.info(f"Удалено остатков в temp/ с прошлого запуска: {removed}")
+    lifecycle.install_signal_handlers()
+    background = [asyncio.create_task(usage.run_flusher())]
+    background.append(asyncio.create_task(access_digest.run(bot, lambda: SUPER_ADMIN)))
+    file_watcher.watch(VOICES_FILE, reload_voices_file, lambda: storage.written_signature)
+    file_watcher.watch(ENV_FILE, reload_env_file)
+    background.append(asyncio.create_task(file_watcher.run()))
+    background.append(asyncio.create_task(health_checker.run(bot, notify_voice_health)))
+    if duplicate_detector.index is not None:
+        background.append(asyncio.create_task(duplicate_detector.index.run_flusher()))
+    if log_sink:
+        background.append(asyncio.create_task(log_sink.run(bot, LOG_CHANNEL_ID)))
+    try:
+        await dp.start_polling(
+            bot,
+            allowed_updates=dp.resolve_used_update_types(),
+            handle_signals=False,    # Сигналы ловит lifecycle
+            close_bot_session=False  # Сессия нужна обработчикам, которые ещё дорабатывают
+        )
+    finally:
+        await lifecycle.drain()
+        await duplicate_detector.cancel_checks()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        usage.flush()
+        if duplicate_detector.index is not None:
+            duplicate_detector.index.flush()
+        lifecycle.clean_temp()
+        await bot.session.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
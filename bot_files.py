@@ -0,0 +1,75 @@
+import io
+import os
+import asyncio
+from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import SimpleFilesPathWrapper, TelegramAPIServer
+
+"""
+Скачивание файлов из Telegram в одном месте.
+С публичным Bot API файлы идут по HTTP и не больше 20 МБ.
+С собственным сервером (telegram-bot-api --local) ограничения нет, а getFile
+возвращает абсолютный путь на диске сервера: если бот видит ту же папку
+(тот же хост или общий volume), файл читается прямо с диска без HTTP.
+
+.env:
+    BOT_API_SERVER=http://localhost:8081
+    BOT_API_LOCAL=1
+    BOT_API_FILES_DIR=/var/lib/telegram-bot-api:/mnt/tg-files   # если у сервера и бота пути разные (docker)
+"""
+
+PUBLIC_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+def make_session() -> Optional[AiohttpSession]:
+    """Сессия на собственный Bot API сервер, если он задан в окружении (иначе None - публичный API)"""
+    server = os.getenv("BOT_API_SERVER", "").strip()
+    if not server:
+        return None
+    is_local = os.getenv("BOT_API_LOCAL", "").strip().lower() in ("1", "true", "yes")
+    options = {}
+    server_dir, _, local_dir = os.getenv("BOT_API_FILES_DIR", "").partition(":")
+    if is_local and server_dir and local_dir:
+        options["wrap_local_file"] = SimpleFilesPathWrapper(Path(server_dir), Path(local_dir))
+    return AiohttpSession(api=TelegramAPIServer.from_base(server, is_local=is_local, **options))
+
+def is_local_server(bot: Bot) -> bool:
+    return bot.session.api.is_local
+
+def can_download(bot: Bot, file_size: Optional[int]) -> bool:
+    """Пройдёт ли файл через лимит публичного Bot API"""
+    return is_local_server(bot) or not file_size or file_size <= PUBLIC_DOWNLOAD_LIMIT
+
+def _local_path(bot: Bot, file_path: str) -> str:
+    return str(bot.session.api.wrap_local_file.to_local(file_path))
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def download_bytes(bot: Bot, file_id: str) -> bytes:
+    """Содержимое файла: с локального диска сервера или по HTTP"""
+    file = await bot.get_file(file_id)
+    if is_local_server(bot):
+        return await asyncio.to_thread(_read, _local_path(bot, file.file_path))
+    buffer = io.BytesIO()
+    await bot.download_file(file.file_path, destination=buffer)
+    return buffer.getvalue()
+
+@asynccontextmanager
+async def file_on_disk(bot: Bot, file_id: str, fallback_path: str) -> AsyncIterator[str]:
+    """Путь к файлу на диске для ffmpeg. С локальным сервером - сам файл сервера
+    (ничего не копируется и не удаляется), иначе скачивается в fallback_path и удаляется после"""
+    file = await bot.get_file(file_id)
+    if is_local_server(bot):
+        yield _local_path(bot, file.file_path)
+        return
+    await bot.download_file(file.file_path, destination=fallback_path)
+    try:
+        yield fallback_path
+    finally:
+        if os.path.exists(fallback_path):
+            os.remove(fallback_path)
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+"""
+Локальная заглушка Bot API для бенчмарков.
+Отвечает на методы, которые дёргает bot.py, не ходя в настоящий Telegram.
+Файлы для getFile берутся из media_dir (video.mp4, voice.ogg и т.д.)
+"""
+
+class FakeBotAPI:
+    def __init__(self, media_dir: str, latency: float = 0.0, is_local: bool = False):
+        self.media_dir = os.path.abspath(media_dir)
+        self.latency = latency          # Искусственная задержка ответа, сек
+        self.is_local = is_local        # Режим локального Bot API (file_path = абсолютный путь)
+        self.calls: Counter = Counter()
+        self.files: Dict[str, str] = {}  # file_id -> имя файла в media_dir
+        self._message_ids = itertools.count(1)
+        self._voice_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def register_file(self, file_id: str, filename: str) -> None:
+        """Привязывает file_id к файлу из media_dir"""
+        self.files[file_id] = filename
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self._handle_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ======================
+    # Обработка запросов
+    # ======================
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post()) if request.can_read_body else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        handler = getattr(self, f"_m_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": handler(params)})
+
+    async def _handle_file(self, request: web.Request) -> web.StreamResponse:
+        self.calls["file_download"] += 1
+        path = os.path.join(self.media_dir, request.match_info["path"])
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    # ======================
+    # Методы Bot API
+    # ======================
+
+    @staticmethod
+    def _param(params: dict, key: str, default=None):
+        value = params.get(key, default)
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    def _message(self, params: dict, **extra) -> dict:
+        chat_id = self._param(params, "chat_id", 0)
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id if isinstance(chat_id, int) else 0, "type": "private"},
+        }
+        message.update(extra)
+        return message
+
+    def _m_getMe(self, params: dict) -> dict:
+        return {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+    def _m_getChat(self, params: dict) -> dict:
+        chat_id = self._param(params, "chat_id", 0)
+        if isinstance(chat_id, str):
+            return {"id": abs(hash(chat_id)) % 10 ** 9, "type": "private", "username": chat_id.lstrip("@")}
+        return {"id": chat_id, "type": "private", "first_name": "User", "username": f"user{chat_id}"}
+
+    def _m_getFile(self, params: dict) -> dict:
+        file_id = self._param(params, "file_id", "")
+        filename = self.files.get(file_id, "voice.ogg")
+        path = os.path.join(self.media_dir, filename)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"u{abs(hash(file_id))}",
+            "file_size": size,
+            "file_path": path if self.is_local else filename,
+        }
+
+    def _m_sendMessage(self, params: dict) -> dict:
+        return self._message(params, text=self._param(params, "text", ""))
+
+    def _m_editMessageText(self, params: dict) -> dict:
+        return self._message(params, text=self._param(params, "text", ""))
+
+    def _m_sendVoice(self, params: dict) -> dict:
+        voice = params.get("voice")
+        size = len(voice.file.read()) if hasattr(voice, "file") else 0
+        file_id = f"BENCH_SENT_VOICE_{next(self._voice_ids)}"
+        return self._message(params, voice={
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "duration": 1,
+            "mime_type": "audio/ogg",
+            "file_size": size,
+        })
+
+    def _m_sendDocument(self, params: dict) -> dict:
+        return self._message(params, document={"file_id": "BENCH_DOC", "file_unique_id": "BENCH_DOC"})
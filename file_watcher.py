@@ -0,0 +1,70 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+"""
+Слежение за файлами опросом os.stat (работает везде, без inotify и зависимостей).
+Колбэк вызывается, когда у файла меняется mtime или размер.
+Если колбэк вернул False (например, файл дописан наполовину), изменение
+не считается принятым и будет обработано, как только файл изменится снова.
+Свои записи программа может пометить через own_write - их колбэк не получает.
+"""
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2.0
+
+Signature = Optional[Tuple[int, int]]
+
+def file_signature(path: str) -> Signature:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class FileWatcher:
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self._callbacks: Dict[str, Callable[[], Awaitable[bool]]] = {}
+        self._signatures: Dict[str, Signature] = {}
+        self._rejected: Dict[str, Signature] = {}  # Чтобы не разбирать один и тот же битый файл
+        self._own_writes: Dict[str, Callable[[], Signature]] = {}
+
+    def watch(
+        self, path: str, callback: Callable[[], Awaitable[bool]],
+        own_write: Optional[Callable[[], Signature]] = None
+    ) -> None:
+        """Подписывает колбэк на изменения файла (текущее состояние считается известным).
+        own_write возвращает подпись последней записи самой программы - такое изменение пропускается"""
+        self._callbacks[path] = callback
+        self._signatures[path] = file_signature(path)
+        if own_write is not None:
+            self._own_writes[path] = own_write
+
+    async def check(self) -> None:
+        for path, callback in self._callbacks.items():
+            signature = file_signature(path)
+            if signature is None or signature in (self._signatures[path], self._rejected.get(path)):
+                continue
+            own_write = self._own_writes.get(path)
+            if own_write is not None and signature == own_write():
+                self._signatures[path] = signature
+                continue
+            try:
+                accepted = await callback()
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки {path}: {e}")
+                accepted = False
+            if accepted:
+                self._signatures[path] = signature
+                self._rejected.pop(path, None)
+            else:
+                self._rejected[path] = signature
+
+    async def run(self) -> None:
+        """Фоновая задача опроса"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
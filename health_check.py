@@ -0,0 +1,154 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from voice_storage import VoiceStorage, write_atomic
+
+"""
+Фоновая проверка, что сохранённые file_id ещё живы (getFile).
+Время последней проверки кешируется в voice_health.json, повторно проверяются только
+записи старше RECHECK_AFTER. Большая библиотека проверяется часами, поэтому записи
+идут кусками по CHUNK_SIZE и после каждого куска кеш и карантин сохраняются -
+после перезапуска проверка продолжается с того же места. Мёртвые file_id уходят в карантин хранилища
+и больше не попадают в инлайн-поиск. Карантинные перепроверяются раз в
+QUARANTINE_RECHECK: если file_id снова отвечает (временный сбой), он возвращается.
+"""
+
+logger = logging.getLogger(__name__)
+
+HEALTH_FILE = "voice_health.json"
+RECHECK_AFTER = 7 * 24 * 3600   # Через сколько перепроверять живой file_id
+QUARANTINE_RECHECK = 24 * 3600  # Через сколько перепроверять file_id из карантина
+CHECK_INTERVAL = 6 * 3600       # Как часто запускать проверку
+CHECK_CONCURRENCY = 3           # Одновременных запросов getFile
+REQUESTS_PER_SECOND = 10        # Общий темп запросов, чтобы не ловить flood wait
+CHUNK_SIZE = 500                # После стольких проверок результат сохраняется (переживает перезапуск)
+
+class FileHealthChecker:
+    def __init__(self, storage: VoiceStorage, path: str = HEALTH_FILE):
+        self.storage = storage
+        self.path = path
+        self.checked: Dict[str, float] = {}  # file_id -> время последней проверки (для карантинных - неудачной)
+        self._next_slot = 0.0
+        self._pace_lock = asyncio.Lock()
+        self._run_lock = asyncio.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.checked = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.checked = {}
+
+    def stale(self) -> List[Tuple[str, str]]:
+        """Голосовые, которые пора перепроверить (карантинные - по своему расписанию)"""
+        now = time.time()
+        return [
+            (title, file_id) for title, file_id in self.storage.voices.items()
+            if self.checked.get(file_id, 0) < now - (
+                QUARANTINE_RECHECK if self.storage.is_quarantined(file_id) else RECHECK_AFTER
+            )
+        ]
+
+    async def _pace(self) -> None:
+        """Общий для всех воркеров темп запросов; после RetryAfter ждут все"""
+        loop = asyncio.get_running_loop()
+        async with self._pace_lock:
+            now = loop.time()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + 1 / REQUESTS_PER_SECOND
+
+    async def _check_one(self, bot: Bot, file_id: str) -> bool:
+        """True - жив, False - мёртв. Сетевые ошибки пробрасываются"""
+        while True:
+            await self._pace()
+            try:
+                await bot.get_file(file_id)
+                return True
+            except TelegramRetryAfter as e:
+                self._next_slot = asyncio.get_running_loop().time() + e.retry_after
+            except TelegramBadRequest:
+                return False
+
+    def _write(self, checked: Dict[str, float]) -> None:
+        write_atomic(self.path, json.dumps(checked))
+
+    async def _save(self) -> None:
+        # json.dumps на сотнях тысяч записей - в потоке, на копии словаря
+        await asyncio.to_thread(self._write, dict(self.checked))
+
+    async def _check_chunk(
+        self, bot: Bot, chunk: List[Tuple[str, str]], concurrency: int
+    ) -> Tuple[int, Dict[str, str], Dict[str, str]]:
+        """Проверяет кусок записей пулом из concurrency воркеров.
+        Возвращает (проверено, мёртвые file_id -> title, вернувшиеся file_id -> title)"""
+        pending = iter(chunk)
+        dead: Dict[str, str] = {}
+        released: Dict[str, str] = {}
+        checked = 0
+
+        async def worker() -> None:
+            nonlocal checked
+            for title, file_id in pending:
+                try:
+                    alive = await self._check_one(bot, file_id)
+                except Exception as e:
+                    logger.warning(f"Не удалось проверить '{title}': {e}")
+                    continue
+                checked += 1
+                self.checked[file_id] = time.time()
+                quarantined = self.storage.is_quarantined(file_id)
+                if alive and quarantined:
+                    released[file_id] = title
+                elif not alive and not quarantined:
+                    dead[file_id] = title
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return checked, dead, released
+
+    async def check(
+        self, bot: Bot, concurrency: int = CHECK_CONCURRENCY, chunk_size: int = CHUNK_SIZE
+    ) -> Tuple[int, List[str], List[str]]:
+        """Проверяет устаревшие записи, сохраняя результат после каждого куска.
+        Возвращает (проверено, названия новых мёртвых, названия вернувшихся из карантина)"""
+        async with self._run_lock:
+            stale = self.stale()
+            checked, all_dead, all_released = 0, [], []
+            for start in range(0, len(stale), chunk_size):
+                count, dead, released = await self._check_chunk(bot, stale[start:start + chunk_size], concurrency)
+                checked += count
+                if dead:
+                    self.storage.quarantine(dead)
+                    logger.warning(f"Недоступные голосовые в карантине: {', '.join(dead.values())}")
+                if released:
+                    self.storage.release(released)
+                    logger.info(f"Голосовые снова доступны, вышли из карантина: {', '.join(released.values())}")
+                all_dead.extend(dead.values())
+                all_released.extend(released.values())
+                await self._save()
+
+            # Удалённые голосовые из кеша выкидываем
+            known = set(self.storage.voices.values())
+            self.checked = {file_id: ts for file_id, ts in self.checked.items() if file_id in known}
+            await self._save()
+            return checked, all_dead, all_released
+
+    async def run(
+        self, bot: Bot, on_change: Callable[[List[str], List[str]], Awaitable[None]], interval: float = CHECK_INTERVAL
+    ) -> None:
+        """Фоновая задача: проверка по расписанию, о новых мёртвых и вернувшихся сообщаем через on_change"""
+        while True:
+            try:
+                _, dead, released = await self.check(bot)
+                if dead or released:
+                    await on_change(dead, released)
+            except Exception as e:
+                logger.error(f"Ошибка проверки file_id: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,106 @@
+import time
+import asyncio
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import InlineQuery
+
+"""
+Middleware для инлайн-запросов:
+- token bucket на пользователя: быстрый набор или кривой клиент не забьёт event loop
+- если пользователь печатает (запросы чаще TYPING_WINDOW), ждём DEBOUNCE и
+  обрабатываем только последний запрос, предыдущие считаются склеенными
+- если новый запрос пришёл, пока старый ещё считается/отвечается, старый отменяется
+"""
+
+BUCKET_CAPACITY = 10        # Запросов подряд без ограничения
+REFILL_PER_SECOND = 4       # Скорость восстановления токенов
+TYPING_WINDOW = 0.5         # Запросы чаще этого считаем набором текста
+DEBOUNCE = 0.15             # Сколько ждать следующую букву
+MAX_TRACKED_USERS = 10_000  # После этого забываем неактивных
+IDLE_AFTER = 60             # Сколько секунд тишины считается неактивностью
+
+class InlineThrottleMiddleware(BaseMiddleware):
+    def __init__(self):
+        self._buckets: Dict[int, List[float]] = {}   # user_id -> [токены, время обновления]
+        self._last_seen: "OrderedDict[int, float]" = OrderedDict()  # От давно молчавших к недавним
+        self._latest: Dict[int, int] = {}            # user_id -> номер последнего запроса
+        self._running: Dict[int, asyncio.Future] = {}
+        self._superseded: Set[asyncio.Future] = set()
+        self._sequence = 0
+        self.stats: Counter = Counter()
+
+    def _take_token(self, user_id: int, now: float) -> bool:
+        tokens, updated = self._buckets.get(user_id, (BUCKET_CAPACITY, now))
+        tokens = min(BUCKET_CAPACITY, tokens + (now - updated) * REFILL_PER_SECOND)
+        if tokens < 1:
+            self._buckets[user_id] = [tokens, now]
+            return False
+        self._buckets[user_id] = [tokens - 1, now]
+        return True
+
+    def _forget_idle(self, now: float) -> None:
+        """Забывает неактивных с начала _last_seen, до первого активного - без обхода всех"""
+        while self._last_seen:
+            user_id, seen = next(iter(self._last_seen.items()))
+            if now - seen <= IDLE_AFTER:
+                break
+            if user_id in self._running:
+                # Запрос ещё отвечается - пользователь активен
+                self._last_seen[user_id] = now
+                self._last_seen.move_to_end(user_id)
+                continue
+            self._last_seen.popitem(last=False)
+            self._buckets.pop(user_id, None)
+            self._latest.pop(user_id, None)
+
+    async def __call__(
+        self,
+        handler: Callable[[InlineQuery, Dict[str, Any]], Awaitable[Any]],
+        event: InlineQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        user_id = event.from_user.id
+        now = time.monotonic()
+        self.stats["received"] += 1
+
+        if not self._take_token(user_id, now):
+            self.stats["dropped"] += 1
+            return None
+
+        typing = now - self._last_seen.get(user_id, 0) < TYPING_WINDOW
+        self._last_seen[user_id] = now
+        self._last_seen.move_to_end(user_id)
+        if len(self._last_seen) > MAX_TRACKED_USERS:
+            self._forget_idle(now)
+
+        self._sequence += 1
+        sequence = self._latest[user_id] = self._sequence
+
+        previous = self._running.get(user_id)
+        if previous and not previous.done() and previous not in self._superseded:
+            self._superseded.add(previous)
+            previous.cancel()
+            self.stats["cancelled"] += 1
+
+        if typing:
+            await asyncio.sleep(DEBOUNCE)
+            if self._latest.get(user_id) != sequence:
+                self.stats["coalesced"] += 1
+                return None
+
+        task = asyncio.ensure_future(handler(event, data))
+        self._running[user_id] = task
+        try:
+            result = await task
+            self.stats["processed"] += 1
+            return result
+        except asyncio.CancelledError:
+            if task not in self._superseded:
+                raise  # Отменили нас самих (остановка бота), а не новым запросом
+            return None
+        finally:
+            self._superseded.discard(task)
+            if self._running.get(user_id) is task:
+                del self._running[user_id]
@@ -13,6 +13,7 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
         keyboard=[
             [KeyboardButton(text="📋 Список голосовых")],
             [KeyboardButton(text="✏️ Переименовать"), KeyboardButton(text="❌ Удалить")],
+            [KeyboardButton(text="☑️ Выбрать несколько"), KeyboardButton(text="🏷 Теги")],
             [KeyboardButton(text="🔄 Обновить меню")]
         ],
         resize_keyboard=True,
@@ -65,9 +66,71 @@ def get_voices_keyboard(action: str) -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
+MULTISELECT_PAGE_SIZE = 10
+
+def get_multiselect_keyboard(titles: list, selected: set, page: int) -> InlineKeyboardMarkup:
+    """Инлайн-клавиатура множественного выбора: галочки, страницы и действия над выбранным.
+    В callback_data индекс из снимка titles, а не название (лимит 64 байта)"""
+    builder = InlineKeyboardBuilder()
+    pages = max(1, (len(titles) + MULTISELECT_PAGE_SIZE - 1) // MULTISELECT_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    start = page * MULTISELECT_PAGE_SIZE
+
+    for idx in range(start, min(start + MULTISELECT_PAGE_SIZE, len(titles))):
+        mark = "✅" if idx in selected else "⬜️"
+        builder.row(InlineKeyboardButton(text=f"{mark} {titles[idx]}", callback_data=f"ms:t:{idx}"))
+
+    builder.row(
+        InlineKeyboardButton(text="◀️", callback_data=f"ms:p:{page - 1}"),
+        InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"ms:p:{page}"),
+        InlineKeyboardButton(text="▶️", callback_data=f"ms:p:{page + 1}")
+    )
+    builder.row(
+        InlineKeyboardButton(text="☑️ Вся страница", callback_data=f"ms:a:{page}"),
+        InlineKeyboardButton(text="⬜️ Снять всё", callback_data=f"ms:n:{page}")
+    )
+    builder.row(
+        InlineKeyboardButton(text=f"🗑 Удалить ({len(selected)})", callback_data="ms:del"),
+        InlineKeyboardButton(text=f"✏️ Переименовать ({len(selected)})", callback_data="ms:ren")
+    )
+    builder.row(InlineKeyboardButton(text="✖️ Закрыть", callback_data="ms:x"))
+    return builder.as_markup()
+
+TAGS_PAGE_SIZE = 10
+
+def get_tag_voices_keyboard(voices: list, page: int, pages: int) -> InlineKeyboardMarkup:
+    """Выбор голосового для тегов, постранично. voices - (title, ключ голосового) текущей страницы.
+    В callback_data ключ (16 символов), а не название: кириллица быстро упирается в лимит 64 байта"""
+    builder = InlineKeyboardBuilder()
+    for title, key in voices:
+        builder.row(InlineKeyboardButton(text=title, callback_data=f"tags:v:{key}"))
+    if pages > 1:
+        builder.row(
+            InlineKeyboardButton(text="◀️", callback_data=f"tags:p:{page - 1}"),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"tags:p:{page}"),
+            InlineKeyboardButton(text="▶️", callback_data=f"tags:p:{page + 1}")
+        )
+    return builder.as_markup()
+
+def get_confirm_keyboard(action: str) -> InlineKeyboardMarkup:
+    """Да/Нет для необратимых действий"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="✅ Да", callback_data=f"{action}:yes")
+    builder.button(text="❌ Нет", callback_data=f"{action}:no")
+    return builder.as_markup()
+
 def get_access_request_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для обработки запросов доступа"""
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Одобрить", callback_data=f"approve:{user_id}")
     builder.button(text="❌ Отклонить", callback_data=f"reject:{user_id}")
     return builder.as_markup()
+
+def get_access_digest_keyboard(requests: list) -> InlineKeyboardMarkup:
+    """Клавиатура дайджеста заявок: по паре кнопок на пользователя"""
+    builder = InlineKeyboardBuilder()
+    for user_id, request in requests:
+        builder.button(text=f"✅ {request['name']}", callback_data=f"approve:{user_id}")
+        builder.button(text="❌ Отклонить", callback_data=f"reject:{user_id}")
+    builder.adjust(2)
+    return builder.as_markup()
@@ -0,0 +1,121 @@
+import os
+import time
+import shutil
+import signal
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import Update
+
+from log_pipeline import ADMIN_ACTION
+
+"""
+Аккуратная остановка бота для перезапусков без потерь:
+- SIGTERM/SIGINT только останавливают получение апдейтов (dp.stop_polling)
+- уже начатые обработчики (включая ffmpeg) дорабатывают до DRAIN_TIMEOUT,
+  после дедлайна отменяются - run_ffmpeg при отмене убивает свой процесс
+- temp/ чистится при старте и остановке
+Сами файлы хранилища дописываются атомарно, их main сбрасывает после drain().
+"""
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = 30.0   # Сколько ждать незавершённые обработчики
+CANCEL_GRACE = 5.0     # Сколько ждать отменённые после дедлайна
+TEMP_DIR = "temp"
+
+class InFlightMiddleware(BaseMiddleware):
+    """Считает апдейты, которые сейчас обрабатываются"""
+
+    def __init__(self):
+        self.tasks: Set[asyncio.Task] = set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        self.idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.tasks.discard(task)
+            if not self.tasks:
+                self.idle.set()
+
+class Lifecycle:
+    def __init__(self, dp: Dispatcher, temp_dir: str = TEMP_DIR, drain_timeout: float = DRAIN_TIMEOUT):
+        self.dp = dp
+        self.temp_dir = temp_dir
+        self.drain_timeout = drain_timeout
+        self.in_flight = InFlightMiddleware()
+        self.stopping = False
+        dp.update.outer_middleware(self.in_flight)
+
+    def install_signal_handlers(self) -> None:
+        """Вместо встроенной обработки сигналов aiogram, которая не ждёт обработчики"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop, sig)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+
+    def request_stop(self, sig: signal.Signals = signal.SIGTERM) -> None:
+        if self.stopping:
+            # Повторный сигнал - не ждём, отменяем всё начатое
+            logger.warning(f"Повторный {sig.name}, отменяю {len(self.in_flight.tasks)} обработчиков")
+            for task in list(self.in_flight.tasks):
+                task.cancel()
+            return
+        self.stopping = True
+        logger.info(f"Получен {sig.name}, перестаю принимать апдейты")
+        asyncio.ensure_future(self._stop_polling())
+
+    async def _stop_polling(self) -> None:
+        try:
+            await self.dp.stop_polling()
+        except RuntimeError:  # Polling ещё не запущен или уже остановлен
+            pass
+
+    async def drain(self) -> float:
+        """Ждёт незавершённые обработчики, по дедлайну отменяет их. Возвращает время ожидания"""
+        started = time.monotonic()
+        pending = len(self.in_flight.tasks)
+        try:
+            await asyncio.wait_for(self.in_flight.idle.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дождались {len(self.in_flight.tasks)} обработчиков за {self.drain_timeout:.0f} с, отменяю")
+            for task in list(self.in_flight.tasks):
+                task.cancel()
+            try:
+                await asyncio.wait_for(self.in_flight.idle.wait(), CANCEL_GRACE)
+            except asyncio.TimeoutError:
+                pass
+        elapsed = time.monotonic() - started
+        logger.info(f"Остановка: обработчиков в работе {pending}, ожидание {elapsed:.2f} с", extra=ADMIN_ACTION)
+        return elapsed
+
+    def clean_temp(self) -> int:
+        """Удаляет остатки конвертаций из temp/, возвращает число удалённых"""
+        if not os.path.isdir(self.temp_dir):
+            return 0
+        removed = 0
+        for name in os.listdir(self.temp_dir):
+            path = os.path.join(self.temp_dir, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.error(f"Ошибка удаления {path}: {e}")
+        return removed
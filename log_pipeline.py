@@ -0,0 +1,192 @@
+import copy
+import json
+import html
+import queue
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Deque, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+"""
+Неблокирующее логирование:
+- хендлеры пишут только в очередь (QueueHandler), файл и консоль обслуживает отдельный поток
+- bot.log - JSON-строки с ротацией по размеру
+- LogChannelSink копит warning/error и действия админов и раз в DIGEST_INTERVAL
+  отправляет их дайджестом в LOG_CHANNEL_ID
+"""
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "bot.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+DIGEST_INTERVAL = 60        # Секунд между дайджестами
+DIGEST_MAX_RECORDS = 500    # Больше не копим, считаем как пропущенные
+DIGEST_MAX_MESSAGES = 3     # Сообщений в канал за один дайджест
+MESSAGE_LIMIT = 4000        # Telegram режет на 4096
+ROW_LIMIT = MESSAGE_LIMIT - 100   # Запас под заголовок дайджеста и хвост «…и ещё N»
+SEND_PAUSE = 3              # Пауза между сообщениями в канал (лимит ~20/мин)
+
+# logger.info("...", extra=ADMIN_ACTION) - попадёт в дайджест канала
+ADMIN_ACTION = {"admin_action": True}
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна JSON-строка"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "admin_action", False):
+            entry["admin_action"] = True
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:  # Уже отформатирован в StructuredQueueHandler
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler.prepare склеивает трейсбек с msg и обнуляет exc_info - тогда поле exc
+    в bot.log никогда не пишется. Здесь трейсбек остаётся отдельно, в exc_text
+    (строка, её можно передать в другой поток, в отличие от объекта исключения)"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+_exception_formatter = logging.Formatter()
+
+def escape_limited(text: str, limit: int) -> str:
+    """html.escape, укладывающийся в limit. Режется исходный текст, а не экранированный,
+    чтобы не разорвать сущность вроде &amp; (Telegram отклонит такое сообщение)"""
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    # Бинарный поиск самого длинного префикса, который после экранирования влезает в limit
+    low, high = 0, min(len(text), limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(html.escape(text[:middle])) <= limit:
+            low = middle
+        else:
+            high = middle - 1
+    return html.escape(text[:low])
+
+class LogChannelSink(logging.Handler):
+    """Копит важные записи для дайджеста. emit вызывается из потока QueueListener"""
+
+    def __init__(self, max_records: int = DIGEST_MAX_RECORDS):
+        super().__init__(level=logging.INFO)
+        self._records: Deque[Tuple[str, str]] = deque()
+        self._records_lock = threading.Lock()
+        self._max_records = max_records
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Свои ошибки отправки в канал не пересылаем, чтобы не зациклиться
+        if record.name == __name__:
+            return
+        if record.levelno < logging.WARNING and not getattr(record, "admin_action", False):
+            return
+        line = f"{record.levelname} {record.name}: {record.getMessage()}"
+        with self._records_lock:
+            if len(self._records) >= self._max_records:
+                self.dropped += 1
+                return
+            self._records.append((record.levelname, line))
+
+    def _drain(self) -> Tuple[Counter, int]:
+        with self._records_lock:
+            records, self._records = self._records, deque()
+            dropped, self.dropped = self.dropped, 0
+        # Одинаковые записи схлопываем в одну строку со счётчиком
+        return Counter(line for _, line in records), dropped
+
+    def _build_messages(self) -> list:
+        lines, dropped = self._drain()
+        if not lines and not dropped:
+            return []
+
+        rows = [
+            escape_limited(line if count == 1 else f"{line} (×{count})", ROW_LIMIT)
+            for line, count in lines.items()
+        ]
+        messages, current = [], "📝 <b>Дайджест логов</b>"
+        for row in rows:
+            if len(current) + len(row) + 1 > MESSAGE_LIMIT:
+                messages.append(current)
+                current = ""
+            current = f"{current}\n{row}" if current else row
+        messages.append(current)
+
+        skipped = dropped + sum(len(message.splitlines()) for message in messages[DIGEST_MAX_MESSAGES:])
+        messages = messages[:DIGEST_MAX_MESSAGES]
+        if skipped:
+            messages[-1] += f"\n…и ещё {skipped} записей (см. bot.log)"
+        return messages
+
+    async def _send(self, bot: Bot, chat_id: str, text: str) -> None:
+        while True:
+            try:
+                await bot.send_message(chat_id, text, disable_notification=True)
+                return
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def send_digest(self, bot: Bot, chat_id: str) -> None:
+        """Отправляет накопленное одним дайджестом"""
+        for index, text in enumerate(self._build_messages()):
+            if index:
+                await asyncio.sleep(SEND_PAUSE)
+            try:
+                await self._send(bot, chat_id, text)
+            except Exception as e:
+                logger.error(f"Не удалось отправить дайджест в канал: {e}")
+                return
+
+    async def run(self, bot: Bot, chat_id: str, interval: float = DIGEST_INTERVAL) -> None:
+        """Фоновая задача отправки дайджестов"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.send_digest(bot, chat_id)
+        except asyncio.CancelledError:
+            await self.send_digest(bot, chat_id)
+            raise
+
+def setup_logging(channel_sink: Optional[LogChannelSink] = None, level: int = logging.INFO) -> QueueListener:
+    """Настраивает корневой логгер на очередь и запускает поток-обработчик"""
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    handlers = [file_handler, stream_handler]
+    if channel_sink:
+        handlers.append(channel_sink)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [StructuredQueueHandler(log_queue)]
+    root.setLevel(level)
+    listener.start()
+    return listener
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram import Bot
+
+from voice_storage import VoiceStorage, VoiceMeta, voice_key
+from video_processor import FFmpegError, run_ffmpeg
+from bot_files import file_on_disk
+
+"""
+Догрузка метаданных для голосовых, сохранённых до появления voices_meta.json.
+Длительность - ffprobe по файлу на диске: у OGG из pipe ffprobe её не видит (Duration: N/A),
+поэтому файл скачивается во временный (с локальным Bot API читается файл сервера).
+Размер - размер этого файла.
+Если ffprobe не справился, запись не сохраняется, и голосовое догрузится в следующий раз.
+Автора и дату добавления уже не узнать, они остаются пустыми.
+"""
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CONCURRENCY = 4
+TEMP_DIR = "temp"
+
+async def probe_duration(path: str) -> Optional[int]:
+    """Длительность аудиофайла в секундах через ffprobe (None, если не получилось)"""
+    try:
+        stdout = await run_ffmpeg("-show_entries", "format=duration", "-of", "csv=p=0", path, program="ffprobe")
+        return round(float(stdout.decode().strip()))
+    except (OSError, ValueError, FFmpegError):
+        return None
+
+async def fetch_meta(bot: Bot, file_id: str, temp_dir: str = TEMP_DIR) -> Optional[VoiceMeta]:
+    """Метаданные по файлу голосового (None, если длительность не определилась)"""
+    os.makedirs(temp_dir, exist_ok=True)
+    fallback_path = os.path.join(temp_dir, f"backfill_{voice_key(file_id)}.ogg")
+    async with file_on_disk(bot, file_id, fallback_path) as path:
+        duration = await probe_duration(path)
+        size = os.path.getsize(path)
+    if duration is None:
+        return None
+    return VoiceMeta(duration, size, "audio/ogg", None, None)
+
+async def backfill_metadata(bot: Bot, storage: VoiceStorage, concurrency: int = BACKFILL_CONCURRENCY) -> int:
+    """Заполняет метаданные для всех голосовых без них, возвращает число обновлённых"""
+    semaphore = asyncio.Semaphore(concurrency)
+    records: Dict[str, VoiceMeta] = {}
+
+    async def worker(title: str, file_id: str) -> None:
+        async with semaphore:
+            try:
+                meta = await fetch_meta(bot, file_id)
+            except Exception as e:
+                logger.warning(f"Не удалось получить метаданные '{title}': {e}")
+                return
+            if meta is None:
+                logger.warning(f"ffprobe не определил длительность '{title}', пропускаю")
+                return
+            records[file_id] = meta
+
+    await asyncio.gather(*(worker(title, file_id) for title, file_id in storage.missing_meta()))
+    if records:
+        storage.update_meta(records)
+    return len(records)
@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+
+"""
+Профилирование по запросу (/profile): включается на ограниченное окно и
+в обычной работе почти ничего не стоит.
+- время каждого обработчика (inner middleware, настенное время вместе с await)
+- семплирующий профайлер: отдельный поток раз в SAMPLE_INTERVAL снимает стек
+  потока event loop через sys._current_frames, результат - collapsed stacks
+  (формат flamegraph.pl / speedscope / inferno)
+- лаг event loop: насколько позже просыпается sleep(LAG_INTERVAL)
+- медленные колбэки: на время окна asyncio.Handle._run оборачивается замером
+  (то же, что делает debug-режим loop, но без его тяжёлых трейсбеков на каждый колбэк)
+"""
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005      # 200 Гц
+LAG_INTERVAL = 0.05
+SLOW_CALLBACK = 0.05         # Колбэки дольше этого попадают в отчёт
+MAX_SECONDS = 300
+TOP_N = 15
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Время обработчиков по имени, пока профайлер включён"""
+
+    def __init__(self):
+        self.active = False
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not self.active:
+            return await handler(event, data)
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.timings[name].append(time.perf_counter() - started)
+
+def _callback_name(handle: asyncio.Handle) -> str:
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):  # Шаг корутины - показываем саму корутину
+        coro = owner.get_coro()
+        return f"{owner.get_name()} {getattr(coro, '__qualname__', coro)}"
+    return getattr(callback, "__qualname__", repr(callback))
+
+@contextmanager
+def _timed_callbacks(slow: List[Tuple[float, str]]):
+    """Замер каждого колбэка event loop, медленные складываются в slow"""
+    original = asyncio.Handle._run
+
+    def timed_run(handle: asyncio.Handle) -> None:
+        started = time.perf_counter()
+        original(handle)
+        duration = time.perf_counter() - started
+        if duration >= SLOW_CALLBACK:
+            slow.append((duration, _callback_name(handle)))
+
+    asyncio.Handle._run = timed_run
+    try:
+        yield
+    finally:
+        asyncio.Handle._run = original
+
+class ProfileReport(NamedTuple):
+    text: str
+    collapsed: bytes
+
+class Profiler:
+    def __init__(self, dp: Dispatcher):
+        self.timing = HandlerTimingMiddleware()
+        for observer in (dp.message, dp.callback_query, dp.inline_query, dp.chosen_inline_result):
+            observer.middleware(self.timing)
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _sample(self, thread_id: int, stop: threading.Event, stacks: Counter) -> None:
+        """Поток семплера: стек потока event loop -> строка collapsed stack"""
+        while not stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                stacks[";".join(reversed(labels))] += 1
+
+    async def _watch_lag(self, stop: asyncio.Event, lags: List[float]) -> None:
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            started = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            lags.append(loop.time() - started - LAG_INTERVAL)
+
+    async def run(self, seconds: float) -> ProfileReport:
+        """Собирает профиль за seconds секунд (одновременно только один)"""
+        seconds = max(1.0, min(seconds, MAX_SECONDS))
+        async with self._lock:
+            stacks: Counter = Counter()
+            lags: List[float] = []
+            slow_callbacks: List[Tuple[float, str]] = []
+            stop_sampler, stop_lag = threading.Event(), asyncio.Event()
+
+            self.timing.timings.clear()
+            self.timing.active = True
+            sampler = threading.Thread(
+                target=self._sample, args=(threading.get_ident(), stop_sampler, stacks),
+                name="profiler-sampler", daemon=True
+            )
+            sampler.start()
+            lag_task = asyncio.create_task(self._watch_lag(stop_lag, lags))
+            try:
+                with _timed_callbacks(slow_callbacks):
+                    await asyncio.sleep(seconds)
+            finally:
+                stop_lag.set()
+                stop_sampler.set()
+                await lag_task
+                await asyncio.to_thread(sampler.join)
+                self.timing.active = False
+
+            timings = dict(self.timing.timings)
+            self.timing.timings.clear()
+            return ProfileReport(
+                format_report(seconds, timings, stacks, lags, slow_callbacks),
+                "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode()
+            )
+
+def format_report(seconds: float, timings: Dict[str, List[float]], stacks: Counter,
+                  lags: List[float], slow_callbacks: List[Tuple[float, str]], top: int = TOP_N) -> str:
+    lines = [f"📈 Профиль за {seconds:.0f} с"]
+
+    lines.append("\nОбработчики (вызовов / всего мс / среднее / макс):")
+    ranked = sorted(timings.items(), key=lambda item: sum(item[1]), reverse=True)[:top]
+    for name, values in ranked:
+        total = sum(values)
+        lines.append(f"{name}: {len(values)} / {total * 1000:.0f} / {total / len(values) * 1000:.1f} / {max(values) * 1000:.1f}")
+    if not ranked:
+        lines.append("нет вызовов")
+
+    total_samples = sum(stacks.values())
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    lines.append(f"\nГорячие функции (семплов: {total_samples}, % по верхнему кадру):")
+    for label, count in leaves.most_common(top):
+        lines.append(f"{count / total_samples * 100:5.1f}% {label}")
+
+    if lags:
+        ordered = sorted(lags)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        lines.append(f"\nЛаг event loop: p99 {p99 * 1000:.1f} мс, макс {ordered[-1] * 1000:.1f} мс")
+
+    lines.append(f"\nМедленные колбэки (> {SLOW_CALLBACK * 1000:.0f} мс): {len(slow_callbacks)}")
+    for duration, name in sorted(slow_callbacks, reverse=True)[:5]:
+        lines.append(f"{duration * 1000:.0f} мс {name[:200]}")
+    return "\n".join(lines)
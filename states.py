@@ -3,6 +3,13 @@ from aiogram.fsm.state import State, StatesGroup
 class RenameStates(StatesGroup):
     waiting_for_new_title = State()
 
+class BatchStates(StatesGroup):
+    selecting = State()
+    waiting_for_pattern = State()
+
+class TagStates(StatesGroup):
+    waiting_for_tags = State()
+
 class AccessStates(StatesGroup):
     waiting_for_access_reason = State()
 
@@ -1,13 +1,53 @@
 import os
-import subprocess
+import asyncio
 import logging
 from typing import Optional
-from aiogram.types import BufferedInputFile, Message
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, Message, Voice
+
+from bot_files import file_on_disk
 
 logger = logging.getLogger(__name__)
 
-async def convert_video_to_voice(message: Message, temp_dir: str = "temp") -> Optional[str]:
-    """Конвертирует видео в голосовое сообщение с корректной загрузкой файла"""
+class FFmpegError(Exception):
+    pass
+
+async def run_ffmpeg(*args: str, input_data: Optional[bytes] = None, program: str = "ffmpeg") -> bytes:
+    """Запускает ffmpeg (или ffprobe), не блокируя event loop. Возвращает stdout.
+    При отмене задачи (например, при остановке бота) процесс убивается"""
+    process = await asyncio.create_subprocess_exec(
+        program, "-v", "error", *args,
+        stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate(input_data)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise FFmpegError(stderr.decode(errors="replace").strip() or f"код {process.returncode}")
+    return stdout
+
+async def extract_voice(bot: Bot, file_id: str, temp_dir: str = "temp", name: str = "video") -> bytes:
+    """Звуковая дорожка видео в OGG/Opus. С локальным Bot API ffmpeg читает файл сервера напрямую"""
+    os.makedirs(temp_dir, exist_ok=True)
+    async with file_on_disk(bot, file_id, os.path.join(temp_dir, f"{name}.mp4")) as video_path:
+        return await run_ffmpeg(
+            '-i', video_path,
+            '-vn',              # Без видео
+            '-ac', '1',         # Моно звук
+            '-ar', '16000',     # Частота дискретизации
+            '-acodec', 'libopus', # Кодек Opus
+            '-f', 'ogg',        # Формат OGG
+            'pipe:1'
+        )
+
+async def convert_video_to_voice(message: Message, temp_dir: str = "temp") -> Optional[Voice]:
+    """Конвертирует видео в голосовое сообщение, возвращает отправленный Voice (file_id и метаданные)"""
     try:
         # Проверяем тип сообщения
         if message.video:
@@ -17,34 +57,11 @@ async def convert_video_to_voice(message: Message, temp_dir: str = "temp") -> Op
         else:
             return None
 
-        # Создаем временную директорию
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Скачиваем видео файл
-        video_path = os.path.join(temp_dir, f"video_{message.from_user.id}.mp4")
-        await message.bot.download(
-            file=video.file_id,
-            destination=video_path
+        # Скачиваем (или берём с диска локального Bot API) и конвертируем в аудио
+        audio_data = await extract_voice(
+            message.bot, video.file_id, temp_dir, f"video_{message.from_user.id}_{message.message_id}"
         )
 
-        # Конвертируем в аудио
-        audio_path = os.path.join(temp_dir, f"audio_{message.from_user.id}.ogg")
-        subprocess.run([
-            'ffmpeg',
-            '-i', video_path,
-            '-vn',              # Без видео
-            '-ac', '1',         # Моно звук
-            '-ar', '16000',     # Частота дискретизации
-            '-acodec', 'libopus', # Кодек Opus
-            '-f', 'ogg',        # Формат OGG
-            '-y',               # Перезаписать если существует
-            audio_path
-        ], check=True)
-
-        # Читаем конвертированный файл
-        with open(audio_path, 'rb') as audio_file:
-            audio_data = audio_file.read()
-
         # Отправляем как голосовое сообщение
         voice_message = await message.bot.send_voice(
             chat_id=message.chat.id,
@@ -55,16 +72,8 @@ async def convert_video_to_voice(message: Message, temp_dir: str = "temp") -> Op
             disable_notification=True
         )
 
-        return voice_message.voice.file_id
+        return voice_message.voice
 
     except Exception as e:
         logger.error(f"Ошибка конвертации: {str(e)}")
         return None
-    finally:
-        # Удаляем временные файлы
-        for file_path in [video_path, audio_path]:
-            if 'file_path' in locals() and file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.error(f"Ошибка удаления файла: {str(e)}")
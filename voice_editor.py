@@ -0,0 +1,120 @@
+import os
+import math
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+from video_processor import FFmpegError, run_ffmpeg
+
+"""
+Правка голосовых без внешних редакторов: обрезка, склейка, смена скорости.
+Голосовые Telegram - Opus в OGG, кадр Opus 20 мс. Если границы обрезки
+попадают на границы кадров, пакеты копируются как есть (-c copy, без потери
+качества и почти мгновенно), иначе - один проход перекодирования.
+Склейка тоже копирует пакеты, если у всех кусков одинаковые параметры потока.
+"""
+
+TEMP_DIR = "temp"
+OPUS_FRAME = 0.02               # Секунд в кадре Opus
+MIN_SPEED, MAX_SPEED = 0.25, 4.0
+MAX_CONCAT_PARTS = 10
+ENCODE_ARGS = ("-c:a", "libopus", "-b:a", "64k", "-ac", "1", "-f", "ogg", "pipe:1")
+
+class EditError(Exception):
+    """Ошибка в параметрах правки, текст показывается админу"""
+
+def parse_seconds(raw: str) -> float:
+    """'75', '75.5', '1:15' или '1:15.5' -> секунды"""
+    try:
+        value = 0.0
+        for part in raw.strip().replace(",", ".").split(":"):
+            value = value * 60 + float(part)
+    except ValueError:
+        raise EditError(f"Не понял время: {raw}")
+    if not math.isfinite(value):
+        raise EditError(f"Не понял время: {raw}")
+    if value < 0:
+        raise EditError(f"Время не может быть отрицательным: {raw}")
+    return value
+
+def parse_speed(raw: str) -> float:
+    """'1.25' или '1,25' -> множитель скорости"""
+    try:
+        factor = float(raw.strip().replace(",", "."))
+    except ValueError:
+        raise EditError(f"Не понял скорость: {raw}")
+    if not math.isfinite(factor) or not MIN_SPEED <= factor <= MAX_SPEED:
+        raise EditError(f"Скорость должна быть от {MIN_SPEED} до {MAX_SPEED}")
+    return factor
+
+def check_concat_parts(count: int) -> None:
+    if not 2 <= count <= MAX_CONCAT_PARTS:
+        raise EditError(f"Склеить можно от 2 до {MAX_CONCAT_PARTS} голосовых")
+
+def is_frame_aligned(seconds: float) -> bool:
+    frames = seconds / OPUS_FRAME
+    return abs(frames - round(frames)) < 1e-6
+
+def atempo_chain(factor: float) -> str:
+    """atempo принимает 0.5..2.0, большие изменения раскладываются в цепочку"""
+    if not MIN_SPEED <= factor <= MAX_SPEED:
+        raise EditError(f"Скорость должна быть от {MIN_SPEED} до {MAX_SPEED}")
+    steps = []
+    while factor > 2.0:
+        steps.append(2.0)
+        factor /= 2.0
+    while factor < 0.5:
+        steps.append(0.5)
+        factor /= 0.5
+    steps.append(factor)
+    return ",".join(f"atempo={step:.6g}" for step in steps)
+
+async def trim(data: bytes, start: float, end: Optional[float] = None) -> Tuple[bytes, bool]:
+    """Обрезка [start, end). Возвращает (ogg, были ли пакеты скопированы без перекодирования)"""
+    if end is not None and end <= start:
+        raise EditError("Конец должен быть позже начала")
+    window = ["-ss", f"{start:.3f}"] + (["-to", f"{end:.3f}"] if end is not None else [])
+    if is_frame_aligned(start) and (end is None or is_frame_aligned(end)):
+        try:
+            return await run_ffmpeg("-i", "pipe:0", *window, "-c:a", "copy", "-f", "ogg", "pipe:1", input_data=data), True
+        except FFmpegError:
+            pass  # Некоторые файлы не режутся копированием - перекодируем
+    return await run_ffmpeg("-i", "pipe:0", *window, *ENCODE_ARGS, input_data=data), False
+
+async def change_speed(data: bytes, factor: float) -> bytes:
+    """Смена скорости без изменения высоты голоса (atempo), всегда перекодирование"""
+    return await run_ffmpeg("-i", "pipe:0", "-filter:a", atempo_chain(factor), *ENCODE_ARGS, input_data=data)
+
+async def _stream_params(path: str) -> str:
+    return (await run_ffmpeg(
+        "-select_streams", "a:0", "-show_entries", "stream=codec_name,channels,sample_rate",
+        "-of", "csv=p=0", path, program="ffprobe"
+    )).decode().strip()
+
+async def concat(parts: List[bytes]) -> Tuple[bytes, bool]:
+    """Склейка по порядку. Возвращает (ogg, были ли пакеты скопированы без перекодирования)"""
+    check_concat_parts(len(parts))
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="concat_", dir=TEMP_DIR)
+    try:
+        paths = []
+        for i, data in enumerate(parts):
+            paths.append(os.path.join(workdir, f"part{i}.ogg"))
+            with open(paths[-1], "wb") as f:
+                f.write(data)
+
+        params = {await _stream_params(path) for path in paths}
+        if len(params) == 1:
+            list_path = os.path.join(workdir, "parts.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                f.writelines(f"file '{os.path.abspath(path)}'\n" for path in paths)
+            try:
+                return await run_ffmpeg("-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-f", "ogg", "pipe:1"), True
+            except FFmpegError:
+                pass
+
+        inputs = [arg for path in paths for arg in ("-i", path)]
+        graph = "".join(f"[{i}:a]" for i in range(len(paths))) + f"concat=n={len(paths)}:v=0:a=1[out]"
+        return await run_ffmpeg(*inputs, "-filter_complex", graph, "-map", "[out]", *ENCODE_ARGS), False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,316 @@
+import json
+import base64
+import shutil
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+
+from voice_storage import VoiceStorage, voice_key, write_atomic
+from video_processor import FFmpegError, run_ffmpeg
+from bot_files import download_bytes
+
+try:
+    import numpy as np
+except ImportError:  # Без numpy поиск похожих просто выключен
+    np = None
+
+"""
+Поиск похожих по звучанию голосовых (одно и то же, перезаписанное или пережатое).
+Аудио декодируется ffmpeg в моно PCM 8 кГц, отпечаток - энергии в BANDS частотных
+полосах, усреднённые по SEGMENTS кускам записи, минус среднее по каждой полосе
+(так громкость и тембр микрофона не влияют, остаётся "рисунок" звука во времени).
+Похожие ищутся по LSH на случайных гиперплоскостях: запись попадает в корзину
+по знакам проекций, сравниваются только записи из тех же корзин.
+"""
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = "voice_fingerprints.json"
+SAMPLE_RATE = 8000
+MAX_SECONDS = 60          # Дальше не декодируем, для сравнения хватает
+FRAME = 512               # 64 мс
+HOP = 256
+BANDS = 16                # Логарифмические полосы 100..3800 Гц
+SEGMENTS = 16             # Кусков по времени
+SILENCE_DB = 40           # Тишина в начале и конце (ниже пика на столько дБ) отрезается
+LSH_TABLES = 16
+LSH_BITS = 8
+LSH_SEED = 1337           # Гиперплоскости должны совпадать между запусками
+SIMILARITY_THRESHOLD = 0.85
+SCAN_CONCURRENCY = 4
+FLUSH_EVERY = 20          # Сбрасывать индекс на диск после стольких новых отпечатков
+FLUSH_INTERVAL = 60       # ...или раз в столько секунд
+
+DIMENSIONS = BANDS * SEGMENTS
+
+async def decode_pcm(data: bytes) -> Optional["np.ndarray"]:
+    """Декодирует любой аудиофайл в моно float32 через ffmpeg (None, если не вышло)"""
+    try:
+        stdout = await run_ffmpeg(
+            "-i", "pipe:0", "-t", str(MAX_SECONDS),
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1",
+            input_data=data,
+        )
+    except (OSError, FFmpegError):
+        return None
+    if not stdout:
+        return None
+    return np.frombuffer(stdout, dtype=np.int16).astype(np.float32) / 32768
+
+@lru_cache(maxsize=1)
+def _band_matrix() -> "np.ndarray":
+    frequencies = np.fft.rfftfreq(FRAME, 1 / SAMPLE_RATE)
+    edges = np.geomspace(100, 3800, BANDS + 1)
+    return ((frequencies[:, None] >= edges[None, :-1]) & (frequencies[:, None] < edges[None, 1:])).astype(np.float32)
+
+def fingerprint(pcm: "np.ndarray") -> Optional["np.ndarray"]:
+    """Нормированный вектор длины DIMENSIONS (None, если звука слишком мало)"""
+    if len(pcm) < FRAME:
+        return None
+    frames = np.lib.stride_tricks.sliding_window_view(pcm, FRAME)[::HOP] * np.hanning(FRAME)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    energy = 10 * np.log10(power @ _band_matrix() + 1e-10)  # frames x BANDS, дБ
+
+    loudness = 10 * np.log10(power.sum(axis=1) + 1e-10)
+    voiced = np.flatnonzero(loudness > loudness.max() - SILENCE_DB)
+    # Тихие места ниже порога одинаковы при любом шуме, иначе шум в паузах перевешивает
+    energy = np.maximum(energy[voiced[0]:voiced[-1] + 1], energy.max() - SILENCE_DB)
+    if len(energy) < SEGMENTS:
+        return None
+
+    starts = np.linspace(0, len(energy), SEGMENTS + 1).astype(int)
+    segments = np.add.reduceat(energy, starts[:-1], axis=0) / np.diff(starts)[:, None]
+    segments -= segments.mean(axis=0)
+    vector = segments.ravel()
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return (vector / norm).astype(np.float32)
+
+class FingerprintIndex:
+    """Отпечатки по file_id + LSH-корзины. Сохраняется в json (float16 в base64)"""
+
+    def __init__(self, path: str = FINGERPRINT_FILE):
+        self.path = path
+        self.vectors: Dict[str, "np.ndarray"] = {}
+        self._planes = np.random.default_rng(LSH_SEED).standard_normal((LSH_TABLES, LSH_BITS, DIMENSIONS)).astype(np.float32)
+        self._weights = 1 << np.arange(LSH_BITS)
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in range(LSH_TABLES)]
+        self._pending = 0
+        self._flush_needed = asyncio.Event()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for file_id, encoded in records.items():
+            vector = np.frombuffer(base64.b64decode(encoded), dtype=np.float16).astype(np.float32)
+            if len(vector) == DIMENSIONS:  # Отпечатки старого формата просто пересчитаются
+                self.add(file_id, vector)
+
+    @staticmethod
+    def _dump(vectors: Dict[str, "np.ndarray"]) -> str:
+        return json.dumps({
+            file_id: base64.b64encode(vector.astype(np.float16).tobytes()).decode()
+            for file_id, vector in vectors.items()
+        })
+
+    def _write(self, vectors: Dict[str, "np.ndarray"]) -> None:
+        write_atomic(self.path, self._dump(vectors))
+
+    def mark_dirty(self, count: int = 1) -> None:
+        """Отмечает изменения: на диск они уйдут пачкой через run_flusher"""
+        self._pending += count
+        if self._pending >= FLUSH_EVERY:
+            self._flush_needed.set()
+
+    def flush(self) -> None:
+        """Синхронно сбрасывает индекс на диск (при остановке)"""
+        if self._pending:
+            self._write(self.vectors)
+            self._pending = 0
+
+    async def run_flusher(self, interval: float = FLUSH_INTERVAL) -> None:
+        """Фоновая задача: пачками сбрасывает индекс на диск.
+        Сериализация тоже идёт в потоке - на копии словаря (векторы не меняются на месте)"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            if not self._pending:
+                continue
+            vectors, self._pending = dict(self.vectors), 0
+            try:
+                await asyncio.to_thread(self._write, vectors)
+            except OSError as e:
+                logger.error(f"Ошибка сохранения отпечатков: {e}")
+
+    def _buckets(self, vector: "np.ndarray") -> List[int]:
+        bits = (self._planes @ vector) > 0  # LSH_TABLES x LSH_BITS
+        return (bits @ self._weights).tolist()
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self.vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def add(self, file_id: str, vector: "np.ndarray") -> None:
+        self.remove(file_id)
+        self.vectors[file_id] = vector
+        for table, bucket in zip(self._tables, self._buckets(vector)):
+            table.setdefault(bucket, set()).add(file_id)
+
+    def remove(self, file_id: str) -> None:
+        vector = self.vectors.pop(file_id, None)
+        if vector is None:
+            return
+        for table, bucket in zip(self._tables, self._buckets(vector)):
+            table[bucket].discard(file_id)
+            if not table[bucket]:
+                del table[bucket]
+
+    def prune(self, keep: Callable[[str], bool]) -> int:
+        """Выкидывает отпечатки, для которых keep вернул False"""
+        stale = [file_id for file_id in self.vectors if not keep(file_id)]
+        for file_id in stale:
+            self.remove(file_id)
+        return len(stale)
+
+    def query(self, vector: "np.ndarray", threshold: float = SIMILARITY_THRESHOLD) -> List[Tuple[str, float]]:
+        """(file_id, сходство) не ниже threshold, сначала самые похожие"""
+        candidates = set()
+        for table, bucket in zip(self._tables, self._buckets(vector)):
+            candidates |= table.get(bucket, set())
+        if not candidates:
+            return []
+        candidates = list(candidates)
+        similarity = np.stack([self.vectors[file_id] for file_id in candidates]) @ vector
+        order = np.argsort(-similarity)
+        return [(candidates[i], float(similarity[i])) for i in order if similarity[i] >= threshold]
+
+class DuplicateDetector:
+    """Связывает индекс отпечатков с хранилищем и Bot API.
+    Индекс меняется только синхронно (между await), поэтому проверка нового голосового
+    не ждёт идущий scan; блокировка лишь не даёт запустить два scan сразу"""
+
+    def __init__(self, storage: VoiceStorage, path: str = FINGERPRINT_FILE):
+        self.storage = storage
+        self.index = FingerprintIndex(path) if np is not None else None
+        self._scan_lock = asyncio.Lock()
+        self._checks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.index is not None and shutil.which("ffmpeg") is not None
+
+    def _title(self, file_id: str) -> Optional[str]:
+        voice = self.storage.get_by_key(voice_key(file_id))
+        return voice[0] if voice and voice[1] == file_id else None
+
+    async def _fingerprint(self, bot: Bot, file_id: str) -> Optional["np.ndarray"]:
+        pcm = await decode_pcm(await download_bytes(bot, file_id))
+        if pcm is None:
+            return None
+        return await asyncio.to_thread(fingerprint, pcm)
+
+    async def check(self, bot: Bot, file_id: str) -> List[str]:
+        """Отпечаток нового голосового: добавляет в индекс и возвращает названия похожих.
+        Ошибки не пробрасываются - сохранение голосового от этого не зависит"""
+        if not self.enabled:
+            return []
+        try:
+            vector = await self._fingerprint(bot, file_id)
+        except Exception as e:
+            logger.warning(f"Не удалось снять отпечаток {file_id}: {e}")
+            return []
+        if vector is None:
+            return []
+
+        similar = [
+            title for other_id, _ in self.index.query(vector)
+            if other_id != file_id and (title := self._title(other_id))
+        ]
+        self.index.add(file_id, vector)
+        self.index.mark_dirty()
+        return similar
+
+    def check_in_background(self, bot: Bot, file_id: str, on_similar: Callable[[List[str]], Awaitable[None]]) -> None:
+        """check() отдельной задачей, чтобы не задерживать ответ о сохранении.
+        on_similar вызывается, только если похожие нашлись"""
+        if not self.enabled:
+            return
+
+        async def run() -> None:
+            similar = await self.check(bot, file_id)
+            if similar:
+                try:
+                    await on_similar(similar)
+                except Exception as e:
+                    logger.warning(f"Не удалось сообщить о похожих на {file_id}: {e}")
+
+        task = asyncio.create_task(run())
+        self._checks.add(task)
+        task.add_done_callback(self._checks.discard)
+
+    async def cancel_checks(self) -> None:
+        """Отменяет незаконченные фоновые проверки (при остановке)"""
+        for task in self._checks:
+            task.cancel()
+        await asyncio.gather(*self._checks, return_exceptions=True)
+
+    async def scan(self, bot: Bot, concurrency: int = SCAN_CONCURRENCY) -> Tuple[int, List[List[str]]]:
+        """Досчитывает отпечатки всей библиотеки и группирует похожие.
+        Возвращает (новых отпечатков, группы названий)"""
+        if not self.enabled:
+            return 0, []
+        semaphore = asyncio.Semaphore(concurrency)
+        computed = 0
+
+        async def worker(title: str, file_id: str) -> None:
+            nonlocal computed
+            async with semaphore:
+                try:
+                    vector = await self._fingerprint(bot, file_id)
+                except Exception as e:
+                    logger.warning(f"Не удалось снять отпечаток '{title}': {e}")
+                    return
+                # Пока качали, голосовое могли удалить
+                if vector is not None and self._title(file_id) is not None:
+                    self.index.add(file_id, vector)
+                    computed += 1
+
+        async with self._scan_lock:
+            pruned = self.index.prune(lambda file_id: self._title(file_id) is not None)
+            missing = [(title, file_id) for title, file_id in self.storage.get_all_voices() if file_id not in self.index]
+            await asyncio.gather(*(worker(title, file_id) for title, file_id in missing))
+            self.index.mark_dirty(pruned + computed)
+            return computed, self._groups()
+
+    def _groups(self) -> List[List[str]]:
+        """Компоненты связности по парам похожих (union-find), по порядку библиотеки"""
+        parent: Dict[str, str] = {}
+
+        def find(file_id: str) -> str:
+            while parent.get(file_id, file_id) != file_id:
+                parent[file_id] = parent.get(parent[file_id], parent[file_id])
+                file_id = parent[file_id]
+            return file_id
+
+        for file_id, vector in self.index.vectors.items():
+            for other_id, _ in self.index.query(vector):
+                if other_id != file_id:
+                    parent[find(other_id)] = find(file_id)
+
+        groups: Dict[str, List[str]] = {}
+        for title, file_id in self.storage.get_all_voices():
+            groups.setdefault(find(file_id), []).append(title)
+        return [titles for titles in groups.values() if len(titles) > 1]
@@ -0,0 +1,100 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from voice_storage import VoiceStorage, normalize_tags
+
+"""
+Разбор инлайн-запроса и поиск по голосовым.
+Фильтры по длительности пишутся прямо в запросе: "<5" - короче 5 секунд, ">10" - длиннее 10.
+Длительность берётся из метаданных хранилища, без запросов к API.
+Теги: "#смех #музыка" - голосовые, у которых есть оба тега (пересечение по инвертированному индексу).
+Последний тег может быть недописан: "#сме" найдёт и #смех, и #смешное.
+"""
+
+DURATION_FILTER = re.compile(r"^([<>])(\d+)(?:s|с|сек)?$")
+MAX_PREFIX_TAGS = 20  # Сколько тегов раскрывать из недописанного префикса
+DENSE_TAG_RATIO = 50  # Совпадений хотя бы 1/50 библиотеки - отдаём их обходом библиотеки
+
+class SearchQuery(NamedTuple):
+    text: str
+    shorter_than: Optional[int] = None
+    longer_than: Optional[int] = None
+    tags: Tuple[str, ...] = ()
+
+    @property
+    def has_filters(self) -> bool:
+        return self.shorter_than is not None or self.longer_than is not None
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.text and not self.has_filters and not self.tags
+
+def parse_query(raw: str) -> SearchQuery:
+    words, tags, shorter_than, longer_than = [], [], None, None
+    for token in raw.lower().split():
+        match = DURATION_FILTER.match(token)
+        if token.startswith("#"):
+            tags.append(token)
+        elif not match:
+            words.append(token)
+        elif match.group(1) == "<":
+            shorter_than = int(match.group(2))
+        else:
+            longer_than = int(match.group(2))
+    return SearchQuery(" ".join(words), shorter_than, longer_than, tuple(normalize_tags(tags)))
+
+def tag_candidates(storage: VoiceStorage, tags: List[str]) -> Iterable[str]:
+    """Titles, у которых есть все теги, по порядку библиотеки; последний тег можно недописать.
+    Пересечение считается от самого маленького множества. Если совпавших много, отдаём их
+    обходом библиотеки (поиск останавливается, как только набрался limit), иначе - сортировкой"""
+    *complete, last = tags
+    if storage.has_tag(last):
+        last_titles = storage.tag_titles(last)
+    else:
+        expanded = storage.tags_with_prefix(last)[:MAX_PREFIX_TAGS]
+        last_titles = set().union(*(storage.tag_titles(tag) for tag in expanded))
+
+    smallest, *others = sorted([storage.tag_titles(tag) for tag in complete] + [last_titles], key=len)
+    matches = smallest.intersection(*others) if others else smallest
+    if len(matches) * DENSE_TAG_RATIO >= len(storage.voices):
+        return (title for title in storage.voices if title in matches)
+    return storage.in_library_order(matches)
+
+def recent_page(storage: VoiceStorage, ranked_keys: Iterable[str], limit: int) -> List[Tuple[str, str]]:
+    """Страница для пустого запроса: сначала ranked_keys (недавние/популярные), затем остальные по порядку"""
+    page, seen = [], set()
+    for key in ranked_keys:
+        voice = storage.get_by_key(key)
+        if voice and not storage.is_quarantined(voice[1]):
+            seen.add(voice[1])
+            page.append(voice)
+    for title, file_id, _, quarantined in storage.iter_rows():
+        if len(page) >= limit:
+            break
+        if file_id not in seen and not quarantined:
+            page.append((title, file_id))
+    return page
+
+def search(storage: VoiceStorage, query: SearchQuery, limit: int) -> Iterator[Tuple[str, str]]:
+    """Отдаёт (title, file_id), подходящие под запрос, не больше limit"""
+    rows = storage.iter_rows(tag_candidates(storage, list(query.tags)) if query.tags else None)
+
+    found = 0
+    for title, file_id, duration, quarantined in rows:
+        if quarantined:
+            continue
+        if query.text and not title.lower().startswith(query.text):
+            continue
+
+        if query.has_filters:
+            if duration is None:
+                continue
+            if query.shorter_than is not None and duration >= query.shorter_than:
+                continue
+            if query.longer_than is not None and duration <= query.longer_than:
+                continue
+
+        yield title, file_id
+        found += 1
+        if found >= limit:
+            return
@@ -1,46 +1,607 @@
 import os
+import sys
 import json
-from typing import Dict, List, Tuple
+import time
+import bisect
+import hashlib
+import logging
+from array import array
+from contextlib import contextmanager
+from collections.abc import ItemsView, Mapping, ValuesView
+from typing import Dict, IO, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from file_watcher import Signature, file_signature
+
+logger = logging.getLogger(__name__)
 
 VOICES_FILE = "voices.json"
+META_FILE = "voices_meta.json"
+TAGS_FILE = "voice_tags.json"
+QUARANTINE_FILE = "voice_quarantine.json"
 MAX_TITLE_LENGTH = 32
+MAX_TAG_LENGTH = 32
+MAX_TAGS_PER_VOICE = 10
+NO_VALUE = -1  # "Нет значения" в числовых колонках метаданных
+
+class VoiceMeta(NamedTuple):
+    """Метаданные голосового, в файле хранятся списком в этом порядке"""
+    duration: Optional[int]      # Секунды
+    file_size: Optional[int]     # Байты
+    mime_type: Optional[str]
+    uploader_id: Optional[int]
+    created_at: Optional[int]    # Unix time
+
+    @classmethod
+    def from_voice(cls, voice, uploader_id: Optional[int] = None) -> "VoiceMeta":
+        """Собирает метаданные из aiogram Voice без запросов к API"""
+        return cls(voice.duration, voice.file_size, voice.mime_type, uploader_id, int(time.time()))
+
+def voice_key(file_id: str) -> str:
+    """Короткий стабильный ключ голосового (id инлайн-результата, переживает переименование)"""
+    return hashlib.md5(file_id.encode()).hexdigest()[:16]
+
+def _key_int(file_id: str) -> int:
+    # Тот же voice_key, но числом: int в словаре легче строки из 16 символов
+    return int.from_bytes(hashlib.md5(file_id.encode()).digest()[:8], "big")
+
+def normalize_tags(raw: Iterable[str]) -> List[str]:
+    """Приводит теги к виду без # в нижнем регистре, без повторов"""
+    tags = []
+    for tag in raw:
+        tag = tag.strip().lstrip("#").lower()[:MAX_TAG_LENGTH]
+        if tag and tag not in tags:
+            tags.append(sys.intern(tag))
+    return tags[:MAX_TAGS_PER_VOICE]
+
+@contextmanager
+def atomic_open(path: str) -> Iterator[IO[str]]:
+    """Открывает path.tmp на запись и после успешной записи подменяет им path (os.replace).
+    Читатели (watcher, ручные правки, перезапуск посреди записи) не видят половину файла"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_atomic(path: str, data: str) -> None:
+    """Записывает строку целиком через atomic_open"""
+    with atomic_open(path) as f:
+        f.write(data)
+
+def read_voices_file(path: str = VOICES_FILE) -> Dict[str, str]:
+    """Читает voices.json (бросает ValueError, если файл битый).
+    Один file_id под несколькими названиями остаётся только у первого - хранилище
+    ищет строку по file_id, и повтор сломал бы ключи и теги"""
+    with open(path, "r", encoding="utf-8") as f:
+        voices = json.load(f)
+    if not isinstance(voices, dict) or not all(isinstance(v, str) for v in voices.values()):
+        raise ValueError("voices.json должен быть объектом title -> file_id")
+    if len(set(voices.values())) == len(voices):
+        return voices
+    unique, seen, skipped = {}, set(), []
+    for title, file_id in voices.items():
+        if file_id in seen:
+            skipped.append(title)
+        else:
+            seen.add(file_id)
+            unique[title] = file_id
+    logger.warning(f"{path}: пропущены названия с уже встречавшимся file_id: {', '.join(skipped)}")
+    return unique
+
+def _none_if_missing(value: int) -> Optional[int]:
+    return None if value == NO_VALUE else value
+
+def _or_missing(value: Optional[int]) -> int:
+    return NO_VALUE if value is None else value
+
+class _VoiceItems(ItemsView):
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return self._mapping._storage._iter_items()
+
+class _VoiceValues(ValuesView):
+    def __iter__(self) -> Iterator[str]:
+        return (file_id for _, file_id in self._mapping._storage._iter_items())
+
+class VoicesView(Mapping):
+    """title -> file_id поверх колонок хранилища, без копирования. Только для чтения"""
+    __slots__ = ("_storage",)
+
+    def __init__(self, storage: "VoiceStorage"):
+        self._storage = storage
+
+    def __getitem__(self, title: str) -> str:
+        return self._storage._file_ids[self._storage._rows[title]]
+
+    def __contains__(self, title: object) -> bool:
+        return title in self._storage._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return (title for title, _ in self._storage._iter_items())
+
+    def __len__(self) -> int:
+        return len(self._storage._rows)
+
+    def items(self) -> _VoiceItems:
+        return _VoiceItems(self)
+
+    def values(self) -> _VoiceValues:
+        return _VoiceValues(self)
 
 class VoiceStorage:
+    """Голосовые хранятся колонками по номеру строки: списки названий и file_id,
+    метаданные - в array. Удаление оставляет пустую строку, которые
+    периодически вычищаются (_compact). Снаружи всё видно через self.voices"""
+
     def __init__(self):
-        self.voices: Dict[str, str] = {}
+        self._titles: List[Optional[str]] = []
+        self._file_ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}        # title -> строка
+        self._key_rows: Dict[int, int] = {}    # _key_int(file_id) -> строка
+        self._duration = array("i")
+        self._file_size = array("q")
+        self._uploader = array("q")
+        self._created = array("q")
+        self._mime: List[Optional[str]] = []
+        self._has_meta = bytearray()
+        self.voices = VoicesView(self)
+        self.tags: Dict[str, List[str]] = {}  # file_id -> теги
+        self._tag_index: Dict[str, Set[str]] = {}  # тег -> titles (инвертированный индекс)
+        self._tag_names: Optional[List[str]] = None  # Отсортированные теги для поиска по префиксу
+        self.quarantined: Set[str] = set()  # file_id, которые не прошли проверку и не показываются в инлайне
+        self.generation = 0  # Растёт при каждом изменении списка голосовых
+        self.written_signature: Signature = None  # (mtime, размер) voices.json после нашей последней записи
         self._load_voices()
-    
+        self._load_meta()
+        self._load_tags()
+        self._load_quarantine()
+
     def _load_voices(self) -> None:
         try:
-            with open(VOICES_FILE, "r", encoding="utf-8") as f:
-                self.voices = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.voices = {}
-    
-    def save_voice(self, title: str, file_id: str) -> bool:
-        if file_id in self.voices.values():
+            voices = read_voices_file()
+        except (FileNotFoundError, ValueError):
+            voices = {}
+        # Колонки собираются целиком, а не по одной строке - на миллионе записей это заметно
+        count = len(voices)
+        self._titles = list(voices)
+        self._file_ids = list(voices.values())
+        self._rows = dict(zip(self._titles, range(count)))
+        self._key_rows = dict(zip(map(_key_int, self._file_ids), self._rows.values()))
+        self._duration = array("i", [NO_VALUE]) * count
+        self._file_size = array("q", [NO_VALUE]) * count
+        self._uploader = array("q", [NO_VALUE]) * count
+        self._created = array("q", [NO_VALUE]) * count
+        self._mime = [None] * count
+        self._has_meta = bytearray(count)
+
+    def _load_meta(self) -> None:
+        try:
+            with open(META_FILE, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            # Идём по строкам, а не по файлу: так не нужно хешировать каждый file_id
+            for row, file_id in enumerate(self._file_ids):
+                record = records.get(file_id)
+                if record is not None:
+                    self._set_meta(row, VoiceMeta(*record))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError, AttributeError):
+            pass
+
+    def _load_tags(self) -> None:
+        try:
+            with open(TAGS_FILE, "r", encoding="utf-8") as f:
+                tags = ((file_id, normalize_tags(tags)) for file_id, tags in json.load(f).items())
+                self.tags = {file_id: tags for file_id, tags in tags if tags}
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            self.tags = {}
+        self._tag_index = {}
+        for title, file_id in self._iter_items():
+            self._index_tags(title, self.tags.get(file_id, ()))
+
+    def _load_quarantine(self) -> None:
+        try:
+            with open(QUARANTINE_FILE, "r", encoding="utf-8") as f:
+                self.quarantined = set(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            self.quarantined = set()
+
+    # Строки и колонки
+    def _iter_items(self) -> Iterator[Tuple[str, str]]:
+        for title, file_id in zip(self._titles, self._file_ids):
+            if title is not None:
+                yield title, file_id
+
+    def iter_rows(self, titles: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, Optional[int], bool]]:
+        """(title, file_id, длительность, в карантине) прямо из колонок, без хеширования file_id.
+        По порядку библиотеки или по переданным titles (все должны существовать)"""
+        quarantined = self.quarantined
+        if titles is not None:
+            for title in titles:
+                row = self._rows[title]
+                file_id = self._file_ids[row]
+                duration = self._duration[row] if self._has_meta[row] else NO_VALUE
+                yield title, file_id, _none_if_missing(duration), file_id in quarantined
+            return
+        for title, file_id, duration, has_meta in zip(self._titles, self._file_ids, self._duration, self._has_meta):
+            if title is not None:
+                yield title, file_id, _none_if_missing(duration) if has_meta else None, file_id in quarantined
+
+    def check_invariants(self) -> List[str]:
+        """Сверяет колонки и индексы между собой, возвращает найденные нарушения (для бенчмарка)"""
+        problems = []
+        lengths = {len(column) for column in (
+            self._titles, self._file_ids, self._duration, self._file_size,
+            self._uploader, self._created, self._mime, self._has_meta,
+        )}
+        if len(lengths) != 1:
+            problems.append(f"колонки разной длины: {sorted(lengths)}")
+        live = {title: row for row, title in enumerate(self._titles) if title is not None}
+        if live != self._rows:
+            problems.append("_rows не совпадает с колонкой названий")
+        keys = {_key_int(self._file_ids[row]): row for row in live.values()}
+        if len(keys) != len(live):
+            problems.append("один file_id в нескольких строках")
+        if keys != self._key_rows:
+            problems.append("_key_rows не совпадает с колонкой file_id")
+        if any(title is None and (file_id is not None or has_meta) for title, file_id, has_meta
+               in zip(self._titles, self._file_ids, self._has_meta)):
+            problems.append("в пустой строке остались file_id или метаданные")
+        tag_index: Dict[str, Set[str]] = {}
+        for title, file_id in self._iter_items():
+            for tag in self.tags.get(file_id, ()):
+                tag_index.setdefault(tag, set()).add(title)
+        if tag_index != self._tag_index:
+            problems.append("индекс тегов не совпадает с тегами")
+        return problems
+
+    def _row_for_file_id(self, file_id: str) -> Optional[int]:
+        row = self._key_rows.get(_key_int(file_id))
+        if row is None or self._file_ids[row] != file_id:
+            return None
+        return row
+
+    def _append_row(self, title: str, file_id: str) -> int:
+        row = len(self._titles)
+        self._titles.append(title)
+        self._file_ids.append(file_id)
+        self._rows[title] = row
+        self._key_rows[_key_int(file_id)] = row
+        self._duration.append(NO_VALUE)
+        self._file_size.append(NO_VALUE)
+        self._uploader.append(NO_VALUE)
+        self._created.append(NO_VALUE)
+        self._mime.append(None)
+        self._has_meta.append(0)
+        return row
+
+    def _clear_row(self, row: int) -> None:
+        title, file_id = self._titles[row], self._file_ids[row]
+        del self._rows[title]
+        if self._key_rows.get(_key_int(file_id)) == row:
+            del self._key_rows[_key_int(file_id)]
+        self._titles[row] = self._file_ids[row] = self._mime[row] = None
+        self._has_meta[row] = 0
+
+    def _set_file_id(self, row: int, file_id: str) -> None:
+        """Подменяет file_id строки на месте, метаданные старого файла сбрасываются"""
+        old_key = _key_int(self._file_ids[row])
+        if self._key_rows.get(old_key) == row:
+            del self._key_rows[old_key]
+        self._file_ids[row] = file_id
+        self._key_rows[_key_int(file_id)] = row
+        self._mime[row] = None
+        self._has_meta[row] = 0
+
+    def _compact(self) -> None:
+        """Выкидывает пустые строки, когда их стало больше половины"""
+        if len(self._titles) < 1024 or len(self._rows) * 2 > len(self._titles):
+            return
+        live = [row for row, title in enumerate(self._titles) if title is not None]
+        self._titles = [self._titles[row] for row in live]
+        self._file_ids = [self._file_ids[row] for row in live]
+        self._mime = [self._mime[row] for row in live]
+        self._duration = array("i", (self._duration[row] for row in live))
+        self._file_size = array("q", (self._file_size[row] for row in live))
+        self._uploader = array("q", (self._uploader[row] for row in live))
+        self._created = array("q", (self._created[row] for row in live))
+        self._has_meta = bytearray(self._has_meta[row] for row in live)
+        self._rows = {title: row for row, title in enumerate(self._titles)}
+        self._key_rows = {_key_int(file_id): row for row, file_id in enumerate(self._file_ids)}
+
+    def _set_meta(self, row: int, meta: VoiceMeta) -> None:
+        self._duration[row] = _or_missing(meta.duration)
+        self._file_size[row] = _or_missing(meta.file_size)
+        self._uploader[row] = _or_missing(meta.uploader_id)
+        self._created[row] = _or_missing(meta.created_at)
+        self._mime[row] = sys.intern(meta.mime_type) if meta.mime_type else None
+        self._has_meta[row] = 1
+
+    def _get_meta(self, row: int) -> VoiceMeta:
+        return VoiceMeta(
+            _none_if_missing(self._duration[row]),
+            _none_if_missing(self._file_size[row]),
+            self._mime[row],
+            _none_if_missing(self._uploader[row]),
+            _none_if_missing(self._created[row]),
+        )
+
+    # Индексы (теги) обновляются точечно при каждом изменении
+    def _index_add(self, title: str, file_id: str) -> None:
+        self._index_tags(title, self.tags.get(file_id, ()))
+
+    def _index_remove(self, title: str, file_id: str) -> None:
+        self._unindex_tags(title, self.tags.get(file_id, ()))
+
+    def _index_tags(self, title: str, tags: Iterable[str]) -> None:
+        for tag in tags:
+            if tag not in self._tag_index:
+                self._tag_index[tag] = set()
+                self._tag_names = None
+            self._tag_index[tag].add(title)
+
+    def _unindex_tags(self, title: str, tags: Iterable[str]) -> None:
+        for tag in tags:
+            titles = self._tag_index.get(tag)
+            if titles is None:
+                continue
+            titles.discard(title)
+            if not titles:
+                del self._tag_index[tag]
+                self._tag_names = None
+
+    def _rename_row(self, row: int, new_title: str) -> None:
+        old_title = self._titles[row]
+        self._index_remove(old_title, self._file_ids[row])
+        del self._rows[old_title]
+        self._titles[row] = new_title
+        self._rows[new_title] = row
+        self._index_add(new_title, self._file_ids[row])
+
+    def save_voice(self, title: str, file_id: str, meta: Optional[VoiceMeta] = None) -> bool:
+        if self._row_for_file_id(file_id) is not None:
             return False
-        self.voices[title] = file_id
+        if title in self._rows:
+            row = self._rows[title]
+            self._index_remove(title, self._file_ids[row])
+            self._set_file_id(row, file_id)
+        else:
+            row = self._append_row(title, file_id)
+        self._index_add(title, file_id)
         self._save_to_file()
+        if meta:
+            self._set_meta(row, meta)
+            self._save_meta_to_file()
         return True
-    
+
     def delete_voice(self, title: str) -> bool:
-        if title in self.voices:
-            del self.voices[title]
+        if title in self._rows:
+            row = self._rows[title]
+            file_id, had_meta = self._file_ids[row], self._has_meta[row]
+            self._index_remove(title, file_id)
+            self._clear_row(row)
+            self._compact()
             self._save_to_file()
+            if had_meta:
+                self._save_meta_to_file()
+            if self.tags.pop(file_id, None):
+                self._save_tags_to_file()
             return True
         return False
-    
+
     def rename_voice(self, old_title: str, new_title: str) -> bool:
-        if old_title in self.voices and new_title not in self.voices:
-            self.voices[new_title] = self.voices.pop(old_title)
+        if old_title in self._rows and new_title not in self._rows:
+            self._rename_row(self._rows[old_title], new_title)
             self._save_to_file()
             return True
         return False
-    
+
+    def replace_file(self, title: str, file_id: str, meta: Optional[VoiceMeta] = None) -> bool:
+        """Подменяет файл голосового (после правки): название, место в списке и теги остаются"""
+        row = self._rows.get(title)
+        if row is None or self._row_for_file_id(file_id) is not None:
+            return False
+        old_file_id = self._file_ids[row]
+        had_meta = self._has_meta[row]
+        self._set_file_id(row, file_id)
+        if meta:
+            self._set_meta(row, meta)
+        self._save_to_file()
+        if meta or had_meta:
+            self._save_meta_to_file()
+        if old_file_id in self.tags:
+            self.tags[file_id] = self.tags.pop(old_file_id)
+            self._save_tags_to_file()
+        return True
+
+    def apply_batch(self, deletes: Iterable[str] = (), renames: Optional[Dict[str, str]] = None) -> bool:
+        """Удаляет и переименовывает пачку голосовых одной транзакцией:
+        либо применяется всё, либо ничего, на диск - одна запись на файл"""
+        deletes = set(deletes)
+        renames = {old: new for old, new in (renames or {}).items() if old != new}
+        sources = deletes | set(renames)
+        targets = list(renames.values())
+
+        if not all(title in self._rows for title in sources) or deletes & set(renames):
+            return False
+        if len(set(targets)) != len(targets) or any(len(new) > MAX_TITLE_LENGTH or not new for new in targets):
+            return False
+        if any(new in self._rows and new not in sources for new in targets):
+            return False
+
+        removed_file_ids, had_meta = [], False
+        for title in deletes:
+            row = self._rows[title]
+            removed_file_ids.append(self._file_ids[row])
+            had_meta = had_meta or bool(self._has_meta[row])
+            self._index_remove(title, self._file_ids[row])
+            self._clear_row(row)
+        # Сначала освобождаем все старые названия, потом занимаем новые - так работают и перестановки
+        moved = [(self._rows[old], new) for old, new in renames.items()]
+        for row, _ in moved:
+            self._index_remove(self._titles[row], self._file_ids[row])
+            del self._rows[self._titles[row]]
+        for row, new in moved:
+            self._titles[row] = new
+            self._rows[new] = row
+            self._index_add(new, self._file_ids[row])
+        self._compact()
+
+        self._save_to_file()
+        if had_meta:
+            self._save_meta_to_file()
+        if any([self.tags.pop(file_id, None) for file_id in removed_file_ids]):
+            self._save_tags_to_file()
+        return True
+
+    def set_tags(self, title: str, tags: Iterable[str]) -> Optional[List[str]]:
+        """Заменяет теги голосового, возвращает итоговый список (None, если нет такого)"""
+        file_id = self.voices.get(title)
+        if file_id is None:
+            return None
+        tags = normalize_tags(tags)
+        self._unindex_tags(title, self.tags.get(file_id, ()))
+        if tags:
+            self.tags[file_id] = tags
+        else:
+            self.tags.pop(file_id, None)
+        self._index_tags(title, tags)
+        self._save_tags_to_file()
+        return tags
+
+    def get_tags(self, file_id: str) -> List[str]:
+        return self.tags.get(file_id, [])
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self._tag_index
+
+    def tag_counts(self) -> Dict[str, int]:
+        return {tag: len(titles) for tag, titles in self._tag_index.items()}
+
+    def tag_titles(self, tag: str) -> Set[str]:
+        """Titles с тегом - живое множество из индекса, только для чтения"""
+        return self._tag_index.get(tag, set())
+
+    def titles_with_tags(self, tags: List[str]) -> Set[str]:
+        """Пересечение множеств по тегам, начиная с самого маленького"""
+        sets = sorted((self.tag_titles(tag) for tag in tags), key=len)
+        if not sets or not sets[0]:
+            return set()
+        result = set(sets[0])
+        for titles in sets[1:]:
+            result &= titles
+            if not result:
+                break
+        return result
+
+    def in_library_order(self, titles: Iterable[str]) -> List[str]:
+        """titles по порядку библиотеки (порядок обхода множества зависит от PYTHONHASHSEED)"""
+        return sorted(titles, key=self._rows.__getitem__)
+
+    def tags_with_prefix(self, prefix: str) -> List[str]:
+        """Теги, начинающиеся с prefix (для недописанного #тега)"""
+        if self._tag_names is None:
+            self._tag_names = sorted(self._tag_index)
+        start = bisect.bisect_left(self._tag_names, prefix)
+        end = bisect.bisect_left(self._tag_names, prefix + "￿")
+        return self._tag_names[start:end]
+
+    def get_by_key(self, key: str) -> Optional[Tuple[str, str]]:
+        """Возвращает (title, file_id) по ключу голосового"""
+        try:
+            row = self._key_rows.get(int(key, 16))
+        except ValueError:
+            return None
+        if row is None:
+            return None
+        return self._titles[row], self._file_ids[row]
+
+    def apply_snapshot(self, voices: Dict[str, str]) -> Tuple[int, int, int]:
+        """Применяет внешнее состояние voices.json, трогая только изменившиеся записи.
+        Возвращает (добавлено, удалено, изменено)"""
+        removed = [title for title in self._rows if title not in voices]
+        changed = [title for title, file_id in voices.items() if self.voices.get(title, file_id) != file_id]
+        added = [title for title in voices if title not in self._rows]
+
+        for title in removed + changed:
+            row = self._rows[title]
+            self._index_remove(title, self._file_ids[row])
+        for title in removed:
+            self._clear_row(self._rows[title])
+        for title in changed:
+            self._set_file_id(self._rows[title], voices[title])
+        for title in added:
+            self._append_row(title, voices[title])
+        for title in changed + added:
+            self._index_add(title, voices[title])
+        self._compact()
+        if removed or changed or added:
+            self.generation += 1
+        return len(added), len(removed), len(changed)
+
+    def get_meta(self, file_id: str) -> Optional[VoiceMeta]:
+        row = self._row_for_file_id(file_id)
+        if row is None or not self._has_meta[row]:
+            return None
+        return self._get_meta(row)
+
+    def update_meta(self, records: Dict[str, VoiceMeta]) -> None:
+        """Сохраняет пачку метаданных одной записью на диск"""
+        for file_id, meta in records.items():
+            row = self._row_for_file_id(file_id)
+            if row is not None:
+                self._set_meta(row, meta)
+        self._save_meta_to_file()
+
+    def missing_meta(self) -> List[Tuple[str, str]]:
+        """Голосовые без метаданных (для догрузки)"""
+        return [
+            (title, self._file_ids[row]) for row, title in enumerate(self._titles)
+            if title is not None and not self._has_meta[row]
+        ]
+
     def _save_to_file(self) -> None:
-        with open(VOICES_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.voices, f, ensure_ascii=False, indent=4)
-    
-    def get_all_voices(self) -> List[Tuple[str, str]]:
-        return list(self.voices.items())
+        # Формат тот же, что у json.dump(indent=4), но без сборки словаря в памяти
+        self.generation += 1
+        with atomic_open(VOICES_FILE) as f:
+            separator = "{\n"
+            for title, file_id in self._iter_items():
+                f.write(f"{separator}    {json.dumps(title, ensure_ascii=False)}: {json.dumps(file_id)}")
+                separator = ",\n"
+            f.write("{}" if separator == "{\n" else "\n}")
+        # Watcher узнаёт свою запись по подписи и не перечитывает файл зря
+        self.written_signature = file_signature(VOICES_FILE)
+
+    def _save_meta_to_file(self) -> None:
+        with atomic_open(META_FILE) as f:
+            separator = "{"
+            for row, file_id in enumerate(self._file_ids):
+                if file_id is not None and self._has_meta[row]:
+                    f.write(f"{separator}{json.dumps(file_id)}: {json.dumps(list(self._get_meta(row)), ensure_ascii=False)}")
+                    separator = ", "
+            f.write("{}" if separator == "{" else "}")
+
+    def is_quarantined(self, file_id: str) -> bool:
+        return file_id in self.quarantined
+
+    def quarantine(self, file_ids: Iterable[str]) -> None:
+        """Прячет file_id из инлайн-поиска (в списках для админов они остаются)"""
+        self.quarantined.update(file_ids)
+        self._save_quarantine_to_file()
+
+    def release(self, file_ids: Iterable[str]) -> None:
+        self.quarantined.difference_update(file_ids)
+        self._save_quarantine_to_file()
+
+    def _save_quarantine_to_file(self) -> None:
+        # Удалённые голосовые в карантине не храним
+        self.quarantined = {file_id for file_id in self.quarantined if self._row_for_file_id(file_id) is not None}
+        write_atomic(QUARANTINE_FILE, json.dumps(sorted(self.quarantined)))
+
+    def _save_tags_to_file(self) -> None:
+        with atomic_open(TAGS_FILE) as f:
+            json.dump(self.tags, f, ensure_ascii=False)
+
+    def get_all_voices(self) -> ItemsView:
+        """(title, file_id) по порядку добавления - представление, а не копия списка"""
+        return self.voices.items()
@@ -0,0 +1,117 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List
+
+from voice_storage import write_atomic
+
+"""
+Статистика выбора голосовых в инлайн-режиме (chosen_inline_result).
+Счётчики затухают со временем, поэтому свежие выборы весят больше старых.
+Страница для пустого запроса пересчитывается при записи, а не при каждом запросе.
+"""
+
+logger = logging.getLogger(__name__)
+
+USAGE_FILE = "usage.json"
+HALF_LIFE = 7 * 24 * 3600      # Через неделю вес выбора падает вдвое
+MAX_KEYS_PER_USER = 30         # Сколько голосовых помнить на пользователя
+MAX_GLOBAL_KEYS = 500          # Сколько голосовых помнить в общем рейтинге
+PAGE_SIZE = 50                 # Лимит результатов инлайн-ответа
+FLUSH_EVERY = 20               # Сбрасывать на диск после стольких выборов
+FLUSH_INTERVAL = 60            # ...или раз в столько секунд
+
+def _decayed(score: float, last_ts: float, now: float) -> float:
+    return score * 0.5 ** ((now - last_ts) / HALF_LIFE)
+
+def _top(entries: Dict[str, List[float]], now: float, limit: int) -> List[str]:
+    return sorted(entries, key=lambda key: _decayed(*entries[key], now), reverse=True)[:limit]
+
+class VoiceUsage:
+    def __init__(self, path: str = USAGE_FILE):
+        self.path = path
+        self.users: Dict[int, Dict[str, List[float]]] = {}  # user_id -> key -> [score, last_ts]
+        self.global_scores: Dict[str, List[float]] = {}     # key -> [score, last_ts]
+        self._user_tops: Dict[int, List[str]] = {}
+        self._global_top: List[str] = []
+        self._pages: Dict[int, List[str]] = {}
+        self._pending = 0
+        self._since_rank = 0
+        self._flush_needed = asyncio.Event()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.users = {int(user_id): entries for user_id, entries in data.get("users", {}).items()}
+            self.global_scores = data.get("global", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.users, self.global_scores = {}, {}
+
+        now = time.time()
+        self._user_tops = {user_id: _top(entries, now, MAX_KEYS_PER_USER) for user_id, entries in self.users.items()}
+        self._global_top = _top(self.global_scores, now, PAGE_SIZE)
+
+    @staticmethod
+    def _bump(entries: Dict[str, List[float]], key: str, now: float, limit: int) -> None:
+        score, last_ts = entries.get(key, (0.0, now))
+        entries[key] = [_decayed(score, last_ts, now) + 1.0, now]
+        if len(entries) > limit:
+            weakest = min(entries, key=lambda k: _decayed(*entries[k], now))
+            del entries[weakest]
+
+    def record(self, user_id: int, key: str) -> None:
+        """Учитывает выбор голосового пользователем"""
+        now = time.time()
+        self._bump(self.users.setdefault(user_id, {}), key, now, MAX_KEYS_PER_USER)
+        self._bump(self.global_scores, key, now, MAX_GLOBAL_KEYS)
+
+        self._user_tops[user_id] = _top(self.users[user_id], now, MAX_KEYS_PER_USER)
+        self._pages.pop(user_id, None)
+        self._pending += 1
+        self._since_rank += 1
+        if self._since_rank >= FLUSH_EVERY:
+            # Общий рейтинг меняется медленно — пересчитываем пачками
+            self._global_top = _top(self.global_scores, now, PAGE_SIZE)
+            self._pages.clear()
+            self._since_rank = 0
+        if self._pending >= FLUSH_EVERY:
+            self._flush_needed.set()
+
+    def ranked_keys(self, user_id: int) -> List[str]:
+        """Ключи голосовых для пустого запроса: свои недавние, затем популярные у всех"""
+        page = self._pages.get(user_id)
+        if page is None:
+            page = list(dict.fromkeys(self._user_tops.get(user_id, []) + self._global_top))[:PAGE_SIZE]
+            self._pages[user_id] = page
+        return page
+
+    def _dump(self) -> str:
+        return json.dumps(
+            {"users": {str(user_id): entries for user_id, entries in self.users.items()}, "global": self.global_scores},
+            ensure_ascii=False
+        )
+
+    def flush(self) -> None:
+        """Синхронно сбрасывает статистику на диск (при остановке)"""
+        if self._pending:
+            write_atomic(self.path, self._dump())
+            self._pending = 0
+
+    async def run_flusher(self, interval: float = FLUSH_INTERVAL) -> None:
+        """Фоновая задача: пачками сбрасывает статистику на диск вне event loop"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            if not self._pending:
+                continue
+            data, self._pending = self._dump(), 0
+            try:
+                await asyncio.to_thread(write_atomic, self.path, data)
+            except OSError as e:
+                logger.error(f"Ошибка сохранения статистики: {e}")